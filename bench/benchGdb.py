@@ -0,0 +1,51 @@
+# This file is sourced by gdb (see runBench.py) after gdbBash.py, once the inferior has stopped at the bench point. It times
+# the operations that the IDE performs at a stop and writes the results as JSON to the file named by $bgBenchOut.
+# Because gdb sources both files into the same namespace, the gdbBash.py globals (onBashObjfilesChanged, etc...) are visible.
+import gdb
+import json
+import os
+import time
+
+# each op is a gdb command whose output is captured and discarded
+benchOps = [
+	('bt',           'bt'),
+	('btFull',       'bt full 20'),
+	('printCommand', 'print *currently_executing_command'),
+	('bashStack',    'bg-bash-stack'),
+	('varsSnapshot', 'bg-vars-snapshot --full'),
+]
+
+def benchTime(cmd):
+	start = time.perf_counter()
+	gdb.execute(cmd, to_string=True)
+	return (time.perf_counter() - start) * 1000
+
+# the cold run starts with no cached metadata or summaries. The warm runs are what an IDE sees when it asks again in the
+# same stop.
+def benchOp(cmd, repeat):
+	onBashObjfilesChanged()
+	try:
+		coldMs = benchTime(cmd)
+		warm = sorted(benchTime(cmd) for i in range(repeat))
+	except gdb.error as e:
+		return {'error': str(e)}
+	return {
+		'coldMs':   round(coldMs, 3),
+		'medianMs': round(warm[len(warm)//2], 3),
+		'minMs':    round(warm[0], 3),
+		'maxMs':    round(warm[-1], 3),
+	}
+
+def benchMain():
+	repeat = int(os.environ.get('bgBenchRepeat', '5'))
+	results = {}
+	if gdb.selected_inferior().pid == 0:
+		results['error'] = 'the inferior did not stop at the bench point'
+	else:
+		gdb.execute('set bgFrameFilters on')
+		for name, cmd in benchOps:
+			results[name] = benchOp(cmd, repeat)
+	with open(os.environ['bgBenchOut'], 'w') as f:
+		json.dump(results, f, indent=1)
+
+benchMain()
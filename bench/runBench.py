@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# Benchmarks the gdbBash.py extension against a bash built with debug info.
+#
+# Each script in bench/scripts/ builds up some state that stresses the extension (deep stacks, huge arrays, long COMMAND trees,
+# many variables, big strings) and then runs the 'times' builtin. gdb is run in batch mode with a breakpoint on times_builtin
+# and, at that stop, bench/benchGdb.py times the stack, locals and printer commands. The results of all the scripts are
+# written to one JSON file and, if a baseline exists, compared to it. Everything runs locally with no network access.
+#
+# usage: bench/runBench.py [--bash <path> | --bash-src <dir>] [--gdb <path>] [--repeat <n>] [--scenario <name>]...
+#                          [--out <file>] [--baseline <file>] [--tolerance <fraction>] [--min-delta-ms <ms>] [--update-baseline]
+#    --bash <path>      : the bash binary to debug. It must have debug info. Default is $bgBenchBash or bench/build/bash
+#    --bash-src <dir>   : configure and build bash from this source tree into bench/build (with -g -O0) and use that
+#    --gdb <path>       : the gdb binary (default 'gdb')
+#    --repeat <n>       : the number of warm runs of each op. The median is compared to the baseline.
+#    --scenario <name>  : only run this script from bench/scripts (without the .sh). Can be given more than once.
+#    --out <file>       : where to write the results (default bench/results/latest.json)
+#    --baseline <file>  : the results to compare against (default bench/baseline.json)
+#    --tolerance <f>    : an op regresses when it is slower than the baseline by more than this fraction (default 0.25)
+#    --min-delta-ms <ms>: ... and by more than this many milliseconds, so that noise in fast ops is ignored (default 2)
+#    --update-baseline  : copy the results to the baseline file instead of comparing
+# Exit Codes:
+#    0 : no regressions (or no baseline to compare against)
+#    1 : at least one op regressed
+#    2 : the benchmark could not be run or a scenario or op failed (the baseline is not updated)
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+benchDir  = os.path.dirname(os.path.abspath(__file__))
+pkgDir    = os.path.dirname(benchDir)
+buildDir  = os.path.join(benchDir, 'build')
+
+# the arguments passed to each scenario script. They are fixed so that runs are comparable with the baseline.
+scenarioArgs = {
+	'deepRecursion': ['300'],
+	'hugeArray':     ['100000'],
+	'longPipeline':  ['200'],
+	'manyVars':      ['20000'],
+	'bigString':     ['4000000'],
+}
+
+# the metrics of each op that are compared to the baseline
+comparedMetrics = ['coldMs', 'medianMs']
+
+class BenchError(Exception):
+	pass
+
+def buildBash(srcDir):
+	os.makedirs(buildDir, exist_ok=True)
+	bashPath = os.path.join(buildDir, 'bash')
+	if not os.path.exists(os.path.join(buildDir, 'Makefile')):
+		subprocess.run([os.path.join(os.path.abspath(srcDir), 'configure'), 'CFLAGS=-g -O0', '--without-bash-malloc'], cwd=buildDir, check=True)
+	subprocess.run(['make', '-j{}'.format(os.cpu_count() or 1)], cwd=buildDir, check=True)
+	return bashPath
+
+def checkDebugInfo(gdbPath, bashPath):
+	proc = subprocess.run([gdbPath, '-batch', '-nx', '-ex', 'ptype WORD_LIST', bashPath], capture_output=True, text=True)
+	if 'struct word_list' not in proc.stdout:
+		raise BenchError("'{}' does not have debug info for bash's structs (ptype WORD_LIST failed)".format(bashPath))
+
+def gdbVersion(gdbPath):
+	proc = subprocess.run([gdbPath, '--version'], capture_output=True, text=True)
+	return proc.stdout.splitlines()[0] if proc.stdout else ''
+
+def runScenario(gdbPath, bashPath, name, repeat):
+	outFile = os.path.join(buildDir, 'scenario-{}.json'.format(name))
+	if os.path.exists(outFile):
+		os.remove(outFile)
+	env = dict(os.environ, bgBenchOut=outFile, bgBenchRepeat=str(repeat))
+	env.pop('bgGdbTrace', None)
+	cmd = [gdbPath, '-batch', '-nx',
+		'-ex', 'set pagination off',
+		'-ex', 'set confirm off',
+		'-ex', 'set detach-on-fork on',
+		'-ex', 'set follow-fork-mode parent',
+		'-ex', 'source '+os.path.join(pkgDir, 'gdbBash.py'),
+		'-ex', 'break times_builtin',
+		'-ex', 'run',
+		'-x', os.path.join(benchDir, 'benchGdb.py'),
+		'--args', bashPath, os.path.join(benchDir, 'scripts', name+'.sh')] + scenarioArgs.get(name, [])
+	start = time.perf_counter()
+	proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, text=True, timeout=1800)
+	wallSec = time.perf_counter() - start
+	if not os.path.exists(outFile):
+		raise BenchError("gdb did not write results for scenario '{}'\n{}".format(name, proc.stdout[-4000:]))
+	with open(outFile) as f:
+		results = json.load(f)
+	results['wallSec'] = round(wallSec, 3)
+	return results
+
+# return the list of (scenario, op, metric, baseline, current) that regressed
+def compareResults(baseline, current, tolerance, minDeltaMs):
+	regressions = []
+	for scenario, ops in current['scenarios'].items():
+		baseOps = baseline.get('scenarios', {}).get(scenario, {})
+		for op, metrics in ops.items():
+			if not isinstance(metrics, dict) or op not in baseOps:
+				continue
+			for metric in comparedMetrics:
+				base = baseOps[op].get(metric)
+				cur = metrics.get(metric)
+				if base is None or cur is None:
+					continue
+				if cur > base * (1 + tolerance) and cur - base > minDeltaMs:
+					regressions.append((scenario, op, metric, base, cur))
+	return regressions
+
+# return the list of (scenario, op, error) for the scenarios and ops that failed. op is None when the whole scenario failed
+def resultErrors(results):
+	errors = []
+	for scenario, ops in results['scenarios'].items():
+		if 'error' in ops:
+			errors.append((scenario, None, ops['error']))
+		for op, metrics in ops.items():
+			if isinstance(metrics, dict) and 'error' in metrics:
+				errors.append((scenario, op, metrics['error']))
+	return errors
+
+def printResults(results):
+	print("{:<16} {:<14} {:>10} {:>10} {:>10}".format('scenario', 'op', 'coldMs', 'medianMs', 'maxMs'))
+	for scenario, ops in results['scenarios'].items():
+		if 'error' in ops:
+			print("{:<16} {:<14} error: {}".format(scenario, '-', ops['error']))
+		for op, metrics in ops.items():
+			if not isinstance(metrics, dict):
+				continue
+			if 'error' in metrics:
+				print("{:<16} {:<14} error: {}".format(scenario, op, metrics['error']))
+			else:
+				print("{:<16} {:<14} {:>10.2f} {:>10.2f} {:>10.2f}".format(scenario, op, metrics['coldMs'], metrics['medianMs'], metrics['maxMs']))
+
+def main(argv):
+	parser = argparse.ArgumentParser(description="Benchmark the gdbBash.py extension")
+	parser.add_argument('--bash', default=os.environ.get('bgBenchBash', os.path.join(buildDir, 'bash')))
+	parser.add_argument('--bash-src')
+	parser.add_argument('--gdb', default='gdb')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--scenario', action='append')
+	parser.add_argument('--out', default=os.path.join(benchDir, 'results', 'latest.json'))
+	parser.add_argument('--baseline', default=os.path.join(benchDir, 'baseline.json'))
+	parser.add_argument('--tolerance', type=float, default=0.25)
+	parser.add_argument('--min-delta-ms', type=float, default=2.0)
+	parser.add_argument('--update-baseline', action='store_true')
+	opts = parser.parse_args(argv)
+
+	try:
+		if not shutil.which(opts.gdb):
+			raise BenchError("gdb not found at '{}'".format(opts.gdb))
+		bashPath = buildBash(opts.bash_src) if opts.bash_src else opts.bash
+		if not os.path.exists(bashPath):
+			raise BenchError("bash not found at '{}'. Use --bash <path> or --bash-src <dir>".format(bashPath))
+		os.makedirs(buildDir, exist_ok=True)
+		checkDebugInfo(opts.gdb, bashPath)
+
+		scenarios = opts.scenario or sorted(scenarioArgs)
+		results = {
+			'meta': {
+				'time':     time.strftime('%Y-%m-%dT%H:%M:%S'),
+				'host':     platform.node(),
+				'python':   platform.python_version(),
+				'gdb':      gdbVersion(opts.gdb),
+				'bash':     os.path.abspath(bashPath),
+				'repeat':   opts.repeat,
+			},
+			'scenarios': {}
+		}
+		for name in scenarios:
+			print("running {} ...".format(name), file=sys.stderr)
+			results['scenarios'][name] = runScenario(opts.gdb, bashPath, name, opts.repeat)
+	except (BenchError, subprocess.SubprocessError, OSError) as e:
+		print("error: {}".format(e), file=sys.stderr)
+		return 2
+
+	os.makedirs(os.path.dirname(os.path.abspath(opts.out)), exist_ok=True)
+	with open(opts.out, 'w') as f:
+		json.dump(results, f, indent=1)
+	printResults(results)
+
+	errors = resultErrors(results)
+	if errors:
+		print("error: {} of the scenarios or ops failed".format(len(errors)), file=sys.stderr)
+		return 2
+
+	if opts.update_baseline:
+		shutil.copyfile(opts.out, opts.baseline)
+		print("baseline updated: {}".format(opts.baseline))
+		return 0
+
+	if not os.path.exists(opts.baseline):
+		print("no baseline at '{}'. Run with --update-baseline to create one".format(opts.baseline))
+		return 0
+	with open(opts.baseline) as f:
+		baseline = json.load(f)
+	regressions = compareResults(baseline, results, opts.tolerance, opts.min_delta_ms)
+	for scenario, op, metric, base, cur in regressions:
+		print("REGRESSION: {} {} {}: {:.2f}ms -> {:.2f}ms (+{:.0f}%)".format(scenario, op, metric, base, cur, (cur/base - 1)*100 if base else 0))
+	return 1 if regressions else 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
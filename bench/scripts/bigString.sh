@@ -0,0 +1,14 @@
+#!/usr/bin/env bash
+# stress: multi-megabyte string values, both as a variable and as an argument of the functions on the stack.
+size="${1:-4000000}"
+
+printf -v bigString '%*s' "$size" ''
+bigString="${bigString// /x}"
+
+takesBigArg()
+{
+	local copy="$1"
+	times >/dev/null
+}
+
+takesBigArg "$bigString"
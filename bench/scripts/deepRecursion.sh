@@ -0,0 +1,16 @@
+#!/usr/bin/env bash
+# stress: a deep bash function stack. Stops at the bench point with <depth> recurse frames on the stack.
+depth="${1:-300}"
+
+recurse()
+{
+	local level="$1"
+	local label="level-$level"
+	if (( level > 0 )); then
+		recurse "$((level-1))"
+	else
+		times >/dev/null
+	fi
+}
+
+recurse "$depth"
@@ -0,0 +1,15 @@
+#!/usr/bin/env bash
+# stress: large indexed and associative arrays visible at the bench point.
+count="${1:-100000}"
+
+declare -a bigArray
+for ((i=0; i<count; i++)); do
+	bigArray[i]="element $i"
+done
+
+declare -A bigAssoc
+for ((i=0; i<count/5; i++)); do
+	bigAssoc["key$i"]="value $i"
+done
+
+times >/dev/null
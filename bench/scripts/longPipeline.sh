@@ -0,0 +1,18 @@
+#!/usr/bin/env bash
+# stress: very long COMMAND trees. The function body is a pipeline of <stages> stages whose last stage runs in this shell
+# (lastpipe) and a long && list so that the summary and AST code has deep CONNECTION chains to walk.
+stages="${1:-200}"
+shopt -s lastpipe
+set +m
+
+pipeline=":"
+for ((i=0; i<stages; i++)); do
+	pipeline+=" | cat"
+done
+andList="true"
+for ((i=0; i<stages*5; i++)); do
+	andList+=" && true"
+done
+
+eval "longPipeline() { $andList && $pipeline | times >/dev/null; }"
+longPipeline
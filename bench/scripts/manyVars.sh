@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+# stress: many global variables and several function contexts full of locals.
+count="${1:-20000}"
+
+for ((i=0; i<count; i++)); do
+	printf -v "globalVar$i" '%s' "global value $i"
+done
+
+withLocals()
+{
+	local depth="$1" i
+	for ((i=0; i<1000; i++)); do
+		local "localVar${depth}_$i=local value $i"
+	done
+	if (( depth > 0 )); then
+		withLocals "$((depth-1))"
+	else
+		times >/dev/null
+	fi
+}
+
+withLocals 5
@@ -2,17 +2,34 @@ import gdb
 import re
 import itertools
 import inspect
+import os
 import sys
+import time
 import traceback
 
 #-break-insert --source /home/bobg/github/bashParse/execute_cmd.c --line 846 -c running_trap==0
 
 from gdb.FrameDecorator  import FrameDecorator
 
-try:
-	_bgtraceFile = open("/tmp/bgtrace.out","a")
-except:
-	_bgtraceFile = None
+################################################################################################################################
+# Reload
+# Gdb.js sources this file into gdb's __main__ namespace at startup and again each time the file changes, so the globals of the
+# previous load are still present when this code runs. Before anything is redefined, the previous load's bgUnload() (see the end
+# of this file) disconnects its event handlers, removes its printers, frame filter, MI commands and breakpoints and closes the
+# trace file. It returns the state worth keeping (parameter values and bash line breakpoints) which this load restores.
+_bgReloadState = {}
+if 'bgUnload' in globals():
+	try:
+		_bgReloadState = bgUnload() or {}
+	except Exception:
+		traceback.print_exc()
+
+# every gdb event handler is connected with bgConnect so that bgUnload can disconnect it
+_bgEventConnections = []
+
+def bgConnect(eventRegistry, handler):
+	eventRegistry.connect(handler)
+	_bgEventConnections.append((eventRegistry, handler))
 
 BASH_TOKENS = {
 	258 : "IF",
@@ -64,133 +81,278 @@ BASH_TOKENS = {
 	304 : "yacc_EOF"
 }
 def getBashToken(id):
-	try:
-		return BASH_TOKENS[id]
-	except:
-		return "UNK_BASH_TOKEN({})".format(id)
+	return bashMeta.tokenName(id)
+
+
+################################################################################################################################
+# bgtrace
+# bgtrace is the debug tracing facility for this extension. It is off by default and can be turned on with the 'bgtrace' gdb
+# parameter (set bgtrace debug) or by setting the bgGdbTrace env var before gdb starts. bgGdbTrace has the form
+# <level>[:<category1>,<category2>...]
+#
+# A trace point that is disabled costs one integer compare. Hot paths should guard any expensive argument construction with
+# bgtraceIsOn(...) or use bgtracef which only formats its message after the level and category tests pass.
+#
+# Formatted messages are handed off to a background thread through a bounded queue so that the gdb thread never waits on file io.
+# If the queue is full, messages are dropped and the number dropped is recorded in the trace file. The file is rotated to
+# <file>.1 when it grows past bgtraceMaxBytes (0 turns rotation off).
+
+TRACE_OFF   = 0
+TRACE_ERROR = 1
+TRACE_WARN  = 2
+TRACE_INFO  = 3
+TRACE_DEBUG = 4
+_bgtraceLevelNames = ['off', 'error', 'warning', 'info', 'debug']
+
+# these are the fast-path state that every trace point checks. They are updated by the bgtrace* gdb parameters
+_bgtraceLevel      = TRACE_OFF
+_bgtraceCategories = None       # None means all categories are on
+_bgtraceFilename   = "/tmp/bgtrace.out"
+_bgtraceMaxBytes   = 10*1024*1024
+_bgtraceWriter     = None
+
+def bgtraceIsOn(level=TRACE_DEBUG, category=None):
+	return _bgtraceLevel >= level and (_bgtraceCategories is None or category in _bgtraceCategories)
+
+def bgtraceConfigure(levelName=None, categories=None, filename=None, maxBytes=None):
+	global _bgtraceLevel, _bgtraceCategories, _bgtraceFilename, _bgtraceMaxBytes
+	if levelName is not None:
+		_bgtraceLevel = _bgtraceLevelNames.index(levelName) if levelName in _bgtraceLevelNames else TRACE_DEBUG
+	if categories is not None:
+		categories = set(filter(None, re.split("[,\\s]+", categories)))
+		_bgtraceCategories = categories or None
+	if filename is not None and filename != _bgtraceFilename:
+		_bgtraceFilename = filename
+		if _bgtraceWriter:
+			_bgtraceWriter.reopen(filename)
+	if maxBytes is not None:
+		_bgtraceMaxBytes = maxBytes
+
+class _BGTraceWriter:
+	def __init__(self, filename, queueSize=4096):
+		import queue
+		import threading
+		self.queue = queue.Queue(queueSize)
+		self.filename = filename
+		self.file = None
+		self.dropped = 0
+		self.thread = threading.Thread(target=self._run, name="bgtraceWriter", daemon=True)
+		self.thread.start()
+
+	def write(self, msg):
+		try:
+			self.queue.put_nowait(msg)
+		except Exception:
+			self.dropped += 1
+
+	def reopen(self, filename):
+		self.write((filename,))
+
+	def close(self, timeout=1.0):
+		self.write(None)
+		self.thread.join(timeout)
+
+	def _open(self):
+		try:
+			self.file = open(self.filename, "a")
+		except Exception:
+			self.file = None
+
+	def _rotate(self):
+		if not self.file or not _bgtraceMaxBytes or self.file.tell() < _bgtraceMaxBytes:
+			return
+		self.file.close()
+		try:
+			os.replace(self.filename, self.filename+".1")
+		except Exception:
+			pass
+		self._open()
+
+	def _run(self):
+		import queue
+		self._open()
+		done = False
+		while not done:
+			batch = [self.queue.get()]
+			# drain whatever else is ready so that we do one write and one flush per batch
+			try:
+				while len(batch) < 512:
+					batch.append(self.queue.get_nowait())
+			except queue.Empty:
+				pass
+
+			if self.dropped:
+				dropped, self.dropped = self.dropped, 0
+				batch.insert(0, "<bgtrace: {} messages dropped because the queue was full>\n".format(dropped))
+
+			text = []
+			for msg in batch:
+				if msg is None:
+					done = True
+					break
+				if isinstance(msg, tuple):
+					if self.file:
+						self.file.write("".join(text))
+						self.file.close()
+					text = []
+					self.filename = msg[0]
+					self._open()
+					continue
+				text.append(msg)
+
+			if self.file and text:
+				self.file.write("".join(text))
+				self.file.flush()
+				self._rotate()
+
+		if self.file:
+			self.file.close()
+
+def _bgtraceEmit(text):
+	global _bgtraceWriter
+	if not _bgtraceWriter:
+		_bgtraceWriter = _BGTraceWriter(_bgtraceFilename)
+	_bgtraceWriter.write(text)
 
+def bgtraceShutdown(event=None):
+	global _bgtraceWriter
+	if _bgtraceWriter:
+		_bgtraceWriter.close()
+		_bgtraceWriter = None
 
 _bgtraceSOL = True;
 
-def _bgtrace(strMsg, indentLevel=0):
-	global bgtraceOn
-	global _bgtraceFile
-	if not bgtraceOn.value or not _bgtraceFile:
-		return
+# append strMsg to the frags list, indenting each line that it starts by indentLevel
+def _bgtraceFrag(frags, strMsg, indentLevel=0):
 	global _bgtraceSOL
 	strMsg=str(strMsg)
 	if indentLevel==0 or not _bgtraceSOL:
-		_bgtraceFile.write('{}'.format(strMsg))
+		frags.append(strMsg)
 	else:
 		# replace all \n<ch> with \n<indent><ch>  (the <ch> stops it from matching the last, trailing \n)
 		strMsg = re.sub("\n(.)", lambda x: '\n{1:{0}s}+{2}'.format(indentLevel*3-1,'',x.group(1)), strMsg)
-		_bgtraceFile.write('{1:{0}s}{2}'.format(indentLevel*3,'',strMsg))
-
-	_bgtraceSOL = re.search("\n$",strMsg)
-	_bgtraceFile.flush()
+		frags.append('{1:{0}s}{2}'.format(indentLevel*3,'',strMsg))
+	_bgtraceSOL = strMsg.endswith("\n")
 
+def _bgtrace(strMsg, indentLevel=0, level=TRACE_DEBUG, category=None):
+	if _bgtraceLevel < level or not bgtraceIsOn(level, category):
+		return
+	frags = []
+	_bgtraceFrag(frags, strMsg, indentLevel)
+	_bgtraceEmit("".join(frags))
+
+# usage: bgtracef(<fmt>, <arg1>..., level=TRACE_DEBUG, category=None)
+# <fmt>.format(<args>) is only done if the trace point is on
+def bgtracef(fmt, *args, level=TRACE_DEBUG, category=None):
+	if _bgtraceLevel < level or not bgtraceIsOn(level, category):
+		return
+	msg = fmt.format(*args) if args else fmt
+	_bgtraceEmit(msg if msg.endswith("\n") else msg+"\n")
 
-def bgtrace(*args, indentLevel=0):
-	global bgtraceOn
-	global _bgtraceFile
-	if not bgtraceOn.value or not _bgtraceFile:
+# usage: bgtrace(<obj1>..., indentLevel=0, level=TRACE_DEBUG, category=None)
+# write a description of each <objN> to the trace file. gdb objects (Symbol, Type, Value) are described in detail.
+def bgtrace(*args, indentLevel=0, level=TRACE_DEBUG, category=None):
+	if _bgtraceLevel < level or not bgtraceIsOn(level, category):
 		return
-	if _bgtraceFile:
-		for msg in args:
-			t = type(msg)
-			tStr = str(t)
+	frags = []
+	for msg in args:
+		_bgtraceFormat(frags, msg, indentLevel)
+		_bgtraceFrag(frags, "\n", indentLevel=indentLevel)
+	_bgtraceEmit("".join(frags))
+
+def _bgtraceFormat(frags, msg, indentLevel=0):
+	t = type(msg)
+	tStr = str(t)
+
+	if t in [str,int,float,complex,bool,bytes, bytearray, memoryview]:
+		_bgtraceFrag(frags, str(msg), indentLevel=indentLevel)
+
+	elif t == dict:
+		_bgtraceFrag(frags, "{}\n".format(str(t)), indentLevel=indentLevel)
+		for name in dir(msg):
+			try:
+				_bgtraceFrag(frags, name+": "+str(getattr(msg, 'name', '<error>'))+"\n", indentLevel=indentLevel+1)
+			except Exception as e:
+				_bgtraceFrag(frags, name+": <error: "+str(e)+">\n", indentLevel=indentLevel+1)
 
-			if t in [str,int,float,complex,bool,bytes, bytearray, memoryview]:
-				_bgtrace(str(msg), indentLevel=indentLevel)
 
-			elif t == dict:
-				_bgtrace("{}\n".format(str(t)), indentLevel=indentLevel)
-				for name in dir(msg):
-					try:
-						_bgtrace(name+": "+str(getattr(msg, 'name', '<error>'))+"\n", indentLevel=indentLevel+1)
-					except Exception as e:
-						_bgtrace(name+": <error: "+str(e)+">\n", indentLevel=indentLevel+1)
-
-
-			elif t == tuple:
-				_bgtrace(str(t)+"\n", indentLevel=indentLevel)
-				count = 0
-				for i in msg:
-					_bgtrace("   [{}]=".format(count), indentLevel=indentLevel+1)
-					bgtrace(i, indentLevel=indentLevel+2)
-					count = count +1
-
-			elif t == list:
-				_bgtrace(str(t)+"\n", indentLevel=indentLevel)
-				count = 0
-				for i in msg:
-					_bgtrace("   [{}]=".format(count), indentLevel=indentLevel+1)
-					bgtrace(i, indentLevel=indentLevel+2)
-					count = count +1
-
-			elif tStr == "<class 'function'>" or tStr == "<class 'gdb.printing.RegexpCollectionPrettyPrinter'>":
-				_bgtrace("name:"+getattr(msg,'__name__',"<UNK>")+" type:"+tStr, indentLevel=indentLevel)
-
-
-			elif isinstance(msg, gdb.Symbol):
-				_bgtrace('<gdb.Symbol>\n', indentLevel=indentLevel);
-				_bgtrace('   name       ={}\n'.format(msg.name), indentLevel=indentLevel);
-				_bgtrace('   type       ={}\n'.format(msg.type), indentLevel=indentLevel);
-				_bgtrace('   needs_frame={}\n'.format(msg.needs_frame), indentLevel=indentLevel);
-				_bgtrace('   value=', indentLevel=indentLevel);
-				try:
-					bgtrace(msg.value(), indentLevel=indentLevel+1);
-				except Exception as e:
-					_bgtrace('<error while accessing value:{}>\n'.format(str(e)), indentLevel=indentLevel+1)
+	elif t == tuple or t == list:
+		_bgtraceFrag(frags, str(t)+"\n", indentLevel=indentLevel)
+		count = 0
+		for i in msg:
+			_bgtraceFrag(frags, "   [{}]=".format(count), indentLevel=indentLevel+1)
+			_bgtraceFormat(frags, i, indentLevel=indentLevel+2)
+			_bgtraceFrag(frags, "\n", indentLevel=indentLevel+2)
+			count = count +1
 
+	elif tStr == "<class 'function'>" or tStr == "<class 'gdb.printing.RegexpCollectionPrettyPrinter'>":
+		_bgtraceFrag(frags, "name:"+getattr(msg,'__name__',"<UNK>")+" type:"+tStr, indentLevel=indentLevel)
 
-			elif isinstance(msg, gdb.Type):
-				try:
-					_bgtrace("<gdp.Type> "+str(msg)+"\n", indentLevel=indentLevel);
-					_bgtrace("name     : {}\n".format(str(msg.name)), indentLevel=indentLevel+1);
-					_bgtrace("code     : {}\n".format(str(msg.code)), indentLevel=indentLevel+1);
-					_bgtrace("sizeof   : {}\n".format(str(msg.sizeof)), indentLevel=indentLevel+1);
-					_bgtrace("tag      : {}\n".format(str(msg.tag)), indentLevel=indentLevel+1);
-					#_bgtrace("is_scalar: {}\n".format(str(getattr(msg, 'is_scalar','<error: is_scalar is not an attribute>'))), indentLevel=indentLevel+1);
 
-					try:
-						for field in msg.fields():
-							_bgtrace("field : {} {}\n".format(str(field.type), field.name), indentLevel=indentLevel+1);
-					except:
-						_bgtrace("field : <none>\n", indentLevel=indentLevel+1)
-				except Exception as e:
-					_bgtrace("<error while bgtrace(<gdb.Type>): error = {}>\n".format(str(e)), indentLevel=indentLevel+1);
-
-
-			elif isinstance(msg, gdb.Value):
-				_bgtrace('<gdb.Value>\n', indentLevel=indentLevel);
-				_bgtrace('   type   = {}\n'.format(str(msg.type)), indentLevel=indentLevel+1);
-				_bgtrace('   address= 0x{:X}\n'.format(int(msg.address)), indentLevel=indentLevel+1);
-				if msg.is_optimized_out:
-					_bgtrace('   !!! is_optimized_out=True !!!\n', indentLevel=indentLevel+1);
-				try:
-					_bgtrace('   value  = {}\n'.format(msg.string()), indentLevel=indentLevel+1);
-				except:
-					_bgtrace('   value  = {}\n'.format(str(msg)), indentLevel=indentLevel+1);
+	elif isinstance(msg, gdb.Symbol):
+		_bgtraceFrag(frags, '<gdb.Symbol>\n', indentLevel=indentLevel);
+		_bgtraceFrag(frags, '   name       ={}\n'.format(msg.name), indentLevel=indentLevel);
+		_bgtraceFrag(frags, '   type       ={}\n'.format(msg.type), indentLevel=indentLevel);
+		_bgtraceFrag(frags, '   needs_frame={}\n'.format(msg.needs_frame), indentLevel=indentLevel);
+		_bgtraceFrag(frags, '   value=', indentLevel=indentLevel);
+		try:
+			_bgtraceFormat(frags, msg.value(), indentLevel=indentLevel+1);
+		except Exception as e:
+			_bgtraceFrag(frags, '<error while accessing value:{}>\n'.format(str(e)), indentLevel=indentLevel+1)
 
-				# for name in dir(msg):
-				# 	_bgtrace("{}: {}\n".format(name, str(getattr(msg,name, "<getattr failed to get value>"))), indentLevel=indentLevel+1)
 
+	elif isinstance(msg, gdb.Type):
+		try:
+			_bgtraceFrag(frags, "<gdp.Type> "+str(msg)+"\n", indentLevel=indentLevel);
+			_bgtraceFrag(frags, "name     : {}\n".format(str(msg.name)), indentLevel=indentLevel+1);
+			_bgtraceFrag(frags, "code     : {}\n".format(str(msg.code)), indentLevel=indentLevel+1);
+			_bgtraceFrag(frags, "sizeof   : {}\n".format(str(msg.sizeof)), indentLevel=indentLevel+1);
+			_bgtraceFrag(frags, "tag      : {}\n".format(str(msg.tag)), indentLevel=indentLevel+1);
 
-			elif isinstance(msg, type(None)):
-				_bgtrace("<None>", indentLevel=indentLevel);
+			try:
+				for field in msg.fields():
+					_bgtraceFrag(frags, "field : {} {}\n".format(str(field.type), field.name), indentLevel=indentLevel+1);
+			except:
+				_bgtraceFrag(frags, "field : <none>\n", indentLevel=indentLevel+1)
+		except Exception as e:
+			_bgtraceFrag(frags, "<error while bgtrace(<gdb.Type>): error = {}>\n".format(str(e)), indentLevel=indentLevel+1);
 
-			else:
-				_bgtrace("{} <unrecognized by bgtrace>\n".format(tStr), indentLevel=indentLevel)
-				_bgtrace("name: {}\n".format(getattr(msg,'__name__',"<No Name>")), indentLevel=indentLevel+1)
-				try:
-					_bgtrace("str()= {}\n".format(str(msg)), indentLevel=indentLevel+1)
-				except Exception as e:
-					_bgtrace("str()= <error:{}>\n".format(str(e)), indentLevel=indentLevel+1)
-				for name in dir(msg):
-					_bgtrace("{}: {}\n".format(name, str(getattr(msg,name, "<getattr failed to get value>"))), indentLevel=indentLevel+1)
-			_bgtrace("\n", indentLevel=indentLevel)
-		_bgtraceFile.flush()
+
+	elif isinstance(msg, gdb.Value):
+		_bgtraceFrag(frags, '<gdb.Value>\n', indentLevel=indentLevel);
+		_bgtraceFrag(frags, '   type   = {}\n'.format(str(msg.type)), indentLevel=indentLevel+1);
+		try:
+			_bgtraceFrag(frags, '   address= 0x{:X}\n'.format(int(msg.address)), indentLevel=indentLevel+1);
+		except:
+			_bgtraceFrag(frags, '   address= <none>\n', indentLevel=indentLevel+1);
+		if msg.is_optimized_out:
+			_bgtraceFrag(frags, '   !!! is_optimized_out=True !!!\n', indentLevel=indentLevel+1);
+		try:
+			_bgtraceFrag(frags, '   value  = {}\n'.format(msg.string()), indentLevel=indentLevel+1);
+		except:
+			_bgtraceFrag(frags, '   value  = {}\n'.format(str(msg)), indentLevel=indentLevel+1);
+
+
+	elif isinstance(msg, type(None)):
+		_bgtraceFrag(frags, "<None>", indentLevel=indentLevel);
+
+	else:
+		_bgtraceFrag(frags, "{} <unrecognized by bgtrace>\n".format(tStr), indentLevel=indentLevel)
+		_bgtraceFrag(frags, "name: {}\n".format(getattr(msg,'__name__',"<No Name>")), indentLevel=indentLevel+1)
+		try:
+			_bgtraceFrag(frags, "str()= {}\n".format(str(msg)), indentLevel=indentLevel+1)
+		except Exception as e:
+			_bgtraceFrag(frags, "str()= <error:{}>\n".format(str(e)), indentLevel=indentLevel+1)
+		for name in dir(msg):
+			_bgtraceFrag(frags, "{}: {}\n".format(name, str(getattr(msg,name, "<getattr failed to get value>"))), indentLevel=indentLevel+1)
+
+# the env var lets tracing be turned on before any gdb commands can be sent (e.g. to trace the loading of this file)
+if os.environ.get('bgGdbTrace'):
+	_envLevel, _, _envCategories = os.environ['bgGdbTrace'].partition(":")
+	bgtraceConfigure(levelName=_envLevel, categories=_envCategories)
+
+import atexit
+atexit.register(bgtraceShutdown)
 
 
 def BGPtrCast(typeStr, val):
@@ -202,46 +364,757 @@ def BGGetValue(gdbValue):
 		typeStr = str(gdbValue.type)
 		if typeStr == "char *":
 			return gdbValue.string()
-		if re.search("^enum",typeStr):
-			return gdbValue.format_string(raw = True)
-
-		bgtrace("BGGetValue:", str(gdbValue.type))
 		return gdbValue.format_string(raw = True)
 	except Exception as e:
 		return "<BGGetValue(gdbVal) failed. type:'{}' error:'{}'>".format(typeStr, str(e))
 
 def signalToString(sigNum):
-	sigTbl = gdb.lookup_symbol('signal_names')[0].value();
-	bgtrace(sigTbl)
+	return bashMeta.signalName(sigNum)
+
+def ShellVar_getI(vVar,index):
+	value = bashArrayReference(int(vVar['value']), index)
+	return value if value is not None else ""
+
+
+################################################################################################################################
+# Native readers
+# These read bash's data structures directly with Inferior.read_memory using struct layouts that are resolved once from the
+# debug info. Walking a structure through gdb.Value field accesses costs several gdb round trips per field which is too slow for
+# long lists.
+
+import struct
+
+# BashStructLayout is the size and the byte offset of each field of a bash struct type
+class BashStructLayout:
+	def __init__(self, typeName):
+		structType = bashMeta.type(typeName).strip_typedefs()
+		self.typeName = typeName
+		self.sizeof = structType.sizeof
+		self.offsets = {}
+		self.sizes = {}
+		for field in structType.fields():
+			self.offsets[field.name] = field.bitpos // 8
+			self.sizes[field.name] = field.type.sizeof
+
+# BashMeta caches the metadata that the printers, summarizers and frame decorators need about the bash binary -- gdb.Types and
+# their pointer types, struct layouts, enum value names, and important symbols. Everything is resolved on first use and kept
+# until the set of objfiles changes. Only the metadata is cached. Symbol values are read each time they are needed.
+class BashMeta:
+	def __init__(self):
+		self.clear()
+
+	def clear(self):
+		self.types     = {}
+		self.ptrTypes  = {}
+		self.layouts   = {}
+		self.enums     = {}
+		self.symbols   = {}
+		self.addrs     = {}
+		self.signals   = {}
+		self.tokens    = None
+		self._ptrStruct = None
+
+	def type(self, typeName):
+		t = self.types.get(typeName)
+		if t is None:
+			t = self.types[typeName] = gdb.lookup_type(typeName)
+		return t
+
+	def ptrType(self, typeName):
+		t = self.ptrTypes.get(typeName)
+		if t is None:
+			t = self.ptrTypes[typeName] = self.type(typeName).pointer()
+		return t
+
+	def layout(self, typeName):
+		layout = self.layouts.get(typeName)
+		if layout is None:
+			layout = self.layouts[typeName] = BashStructLayout(typeName)
+		return layout
+
+	# return a dict that maps the values of the enum <typeName> (e.g. 'enum command_type') to their names
+	def enumNames(self, typeName):
+		names = self.enums.get(typeName)
+		if names is None:
+			names = self.enums[typeName] = {int(field.enumval): field.name for field in self.type(typeName).fields()}
+		return names
+
+	# return the gdb.Symbol for the global or file static variable <name> or None if it does not exist
+	def symbol(self, name):
+		sym = self.symbols.get(name, False)
+		if sym is False:
+			sym = gdb.lookup_global_symbol(name)
+			if sym is None and hasattr(gdb, 'lookup_static_symbol'):
+				sym = gdb.lookup_static_symbol(name)
+			if sym is None:
+				try:
+					sym = gdb.lookup_symbol(name)[0]
+				except gdb.error:
+					pass
+			self.symbols[name] = sym
+		return sym
+
+	# return the address of the global variable <name>. The address does not change so it can be used to read the variable's
+	# current value with a BashMemReader without going through gdb.Value
+	def symbolAddr(self, name):
+		addr = self.addrs.get(name)
+		if addr is None:
+			sym = self.symbol(name)
+			if sym is None:
+				raise gdb.GdbError("bash symbol '{}' not found. Is the debug info for bash loaded?".format(name))
+			addr = self.addrs[name] = int(sym.value().address)
+		return addr
+
+	# return the pointer value currently stored in the global variable <name>
+	def globalPtr(self, name, reader=None):
+		return (reader or BashMemReader()).readPtr(self.symbolAddr(name))
+
+	# return the value currently stored in the global int variable <name>
+	def globalInt(self, name, reader=None):
+		return (reader or BashMemReader()).readInt(self.symbolAddr(name), self.symbol(name).type.sizeof)
+
+	def signalName(self, sigNum):
+		sigName = self.signals.get(sigNum)
+		if sigName is None:
+			try:
+				reader = BashMemReader()
+				sigPtr = reader.readPtr(self.symbolAddr('signal_names') + sigNum*reader.ptr.size)
+				sigName = reader.readCString(sigPtr)[0] if sigPtr else None
+			except Exception:
+				sigName = None
+			if sigName is None:
+				return '{}(UNK name)'.format(str(sigNum))
+			# signal_names is filled in when bash initializes so only cache names that have been set
+			self.signals[sigNum] = sigName
+		return sigName
+
+	# return the name of the parser token <id>. The names come from the yytokentype enum when it is in the debug info and
+	# from the BASH_TOKENS table when it is not
+	def tokenName(self, id):
+		if self.tokens is None:
+			try:
+				self.tokens = self.enumNames('enum yytokentype')
+			except Exception:
+				self.tokens = BASH_TOKENS
+		try:
+			return self.tokens[id]
+		except KeyError:
+			return "UNK_BASH_TOKEN({})".format(id)
+
+	# return the struct.Struct that decodes a pointer in the target's size and byte order
+	def ptrStruct(self):
+		if not self._ptrStruct:
+			ptrSize = gdb.lookup_type('void').pointer().sizeof
+			try:
+				byteOrder = '>' if 'big endian' in gdb.execute("show endian", to_string=True) else '<'
+			except Exception:
+				byteOrder = '<' if sys.byteorder == 'little' else '>'
+			self._ptrStruct = struct.Struct(byteOrder + ('Q' if ptrSize == 8 else 'I'))
+		return self._ptrStruct
+
+bashMeta = BashMeta()
+
+def bashLayout(typeName):
+	return bashMeta.layout(typeName)
+
+def bashPtrStruct():
+	return bashMeta.ptrStruct()
+
+# all the caches that are derived from the debug info are invalid when the set of objfiles changes
+def onBashObjfilesChanged(event=None):
+	bashProfiler.pause()
+	bashMeta.clear()
+	_cmdSummaryCache.clear()
+	_cmdAstCache.clear()
+	_stopCache.clear()
+	bashMemMap.clear()
+	clearBashPrinterCache()
+	clearBashGlobalSymbols()
+	bashProfiler.resume()
+
+bgConnect(gdb.events.new_objfile, onBashObjfilesChanged)
+bgConnect(gdb.events.clear_objfiles, onBashObjfilesChanged)
+
+# BashMemReader reads bytes, pointers and C strings from the selected inferior
+class BashMemReader:
+	def __init__(self, inferior=None):
+		self.inferior = inferior or gdb.selected_inferior()
+		self.ptr = bashPtrStruct()
+		self.byteOrder = 'big' if self.ptr.format[0] == '>' else 'little'
+
+	def read(self, addr, length):
+		return self.inferior.read_memory(addr, length).tobytes()
+
+	def readPtr(self, addr):
+		return self.ptr.unpack(self.read(addr, self.ptr.size))[0]
+
+	def ptrAt(self, buf, offset):
+		return self.ptr.unpack_from(buf, offset)[0]
+
+	def readInt(self, addr, size, signed=True):
+		return int.from_bytes(self.read(addr, size), self.byteOrder, signed=signed)
+
+	# decode the integer field <fieldName> of <layout> from <buf> which holds a whole struct
+	def intAt(self, buf, layout, fieldName, signed=True):
+		offset = layout.offsets[fieldName]
+		return int.from_bytes(buf[offset:offset+layout.sizes[fieldName]], self.byteOrder, signed=signed)
+
+	# usage: text, truncated = reader.readCString(<addr>, [<maxBytes>])
+	# reads are done in chunks that stay within a 256 byte aligned block so that a short string at the end of a mapped page
+	# does not make us read past the page
+	def readCString(self, addr, maxBytes=0):
+		chunks = []
+		total = 0
+		truncated = False
+		while True:
+			length = 256 - (addr & 255)
+			if maxBytes:
+				if total >= maxBytes:
+					truncated = True
+					break
+				length = min(length, maxBytes - total)
+			data = self.read(addr, length)
+			nul = data.find(b'\0')
+			if nul >= 0:
+				chunks.append(data[:nul])
+				break
+			chunks.append(data)
+			total += length
+			addr += length
+		return b"".join(chunks).decode('utf-8', 'replace'), truncated
+
+# ProcMemReader is a BashMemReader that reads /proc/<pid>/mem directly instead of going through gdb. It can be used from a
+# thread other than gdb's and while the inferior is running (gdb is its tracer so the kernel allows the reads). It must be
+# constructed on the gdb thread.
+class ProcMemReader(BashMemReader):
+	def __init__(self, pid):
+		super(ProcMemReader, self).__init__()
+		self.fd = os.open("/proc/{}/mem".format(pid), os.O_RDONLY)
+
+	def read(self, addr, length):
+		data = os.pread(self.fd, length, addr)
+		if len(data) != length:
+			raise OSError("short read of {} bytes at 0x{:x}".format(length, addr))
+		return data
+
+	def close(self):
+		if self.fd is not None:
+			os.close(self.fd)
+			self.fd = None
+
+# /proc on this host only describes the inferior if gdb is running it natively. Inferior.connection is gdb 11+ so older
+# versions are treated as not native and callers use a method that is right for every target.
+def isNativeInferior(inferior):
+	connection = getattr(inferior, 'connection', None)
+	return connection is not None and connection.type == 'native'
+
+# True if the inferior is a core file. Like isNativeInferior, gdb before 11 can not tell so it returns False there
+def isCoreInferior(inferior):
+	connection = getattr(inferior, 'connection', None)
+	return connection is not None and connection.type == 'core'
+
+import bisect
+
+# BashMemMap is an index of the readable address ranges of the selected inferior so that pointers can be checked without a
+# read_memory round trip per pointer. It is built once per stop from /proc/<pid>/maps for a live native process. For other
+# targets it is the union of 'info proc mappings' and the sections listed by 'info files'. Both are needed for core files:
+# 'info proc mappings' only lists the file backed (NT_FILE) mappings of a core while the heap, stack and anonymous regions are
+# only in its load sections. 'info files' alone only covers the exec file's sections, so for a live process on a target that
+# can not list its mappings (e.g. a gdbserver without /proc) no index is built and isReadableAddr probes instead. The ranges
+# are kept sorted and merged so that a lookup is a binary search.
+class BashMemMap:
+	def __init__(self):
+		self.inferiorNum = None
+		self.starts = None
+		self.ends = None
+
+	def clear(self, event=None):
+		self.inferiorNum = None
+		self.starts = None
+		self.ends = None
+
+	# return True or False if the index knows whether [addr, addr+length) is readable, or None if no index could be built
+	def isReadable(self, addr, length=1):
+		inferior = gdb.selected_inferior()
+		if self.starts is None or self.inferiorNum != inferior.num:
+			self.build(inferior)
+		if not self.starts:
+			return None
+		i = bisect.bisect_right(self.starts, addr) - 1
+		return i >= 0 and addr + length <= self.ends[i]
+
+	def build(self, inferior):
+		self.inferiorNum = inferior.num
+		ranges = []
+		try:
+			if inferior.pid and isNativeInferior(inferior):
+				ranges = self._procMaps(inferior.pid)
+			if not ranges:
+				mappings = self._infoProcMappings()
+				if mappings or not inferior.pid or isCoreInferior(inferior):
+					ranges = mappings + self._infoFiles()
+		except Exception:
+			bgtrace("BashMemMap::build(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='memmap')
+		ranges.sort()
+		starts = []
+		ends = []
+		for start, end in ranges:
+			if ends and start <= ends[-1]:
+				ends[-1] = max(ends[-1], end)
+			else:
+				starts.append(start)
+				ends.append(end)
+		self.starts = starts
+		self.ends = ends
+		bgtracef("BashMemMap built with {} ranges", len(starts), level=TRACE_INFO, category='memmap')
+
+	def _procMaps(self, pid):
+		ranges = []
+		try:
+			with open("/proc/{}/maps".format(pid)) as f:
+				for line in f:
+					addrs, perms = line.split(None, 2)[:2]
+					if perms[0] == 'r':
+						start, end = addrs.split('-')
+						ranges.append((int(start, 16), int(end, 16)))
+		except (OSError, ValueError):
+			return []
+		return ranges
+
+	_mappingRe = re.compile(r"^\s*0x([0-9a-f]+)\s+0x([0-9a-f]+)\s+0x[0-9a-f]+\s+0x[0-9a-f]+(?:\s+([r-])[w-][x-][ps])?")
+
+	def _infoProcMappings(self):
+		try:
+			text = gdb.execute("info proc mappings", to_string=True)
+		except gdb.error:
+			return []
+		ranges = []
+		for line in text.splitlines():
+			match = self._mappingRe.match(line)
+			if match and match.group(3) != '-':
+				ranges.append((int(match.group(1), 16), int(match.group(2), 16)))
+		return ranges
+
+	_sectionRe = re.compile(r"^\s*0x([0-9a-f]+) - 0x([0-9a-f]+) is ")
+
+	def _infoFiles(self):
+		try:
+			text = gdb.execute("info files", to_string=True)
+		except gdb.error:
+			return []
+		ranges = []
+		for line in text.splitlines():
+			match = self._sectionRe.match(line)
+			if match:
+				ranges.append((int(match.group(1), 16), int(match.group(2), 16)))
+		return ranges
+
+bashMemMap = BashMemMap()
+
+# check <addr> with the memory map index and only fall back to probing the inferior if the index could not be built
+def isReadableAddr(addr, length=1):
+	readable = bashMemMap.isReadable(addr, length)
+	if readable is not None:
+		return readable
 	try:
-		sigName = sigTbl[sigNum] if sigTbl else None;
+		gdb.selected_inferior().read_memory(addr, length)
+		return True
+	except gdb.MemoryError:
+		return False
 	except:
-		sigName = '{}(UNK name)'.format(str(sigNum))
-	return sigName;
+		bgtrace("isReadableAddr(): probe read threw exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
+		return False
+
+bgConnect(gdb.events.stop, bashMemMap.clear)
+bgConnect(gdb.events.cont, bashMemMap.clear)
+bgConnect(gdb.events.exited, bashMemMap.clear)
+
+_whitespaceRe = re.compile("\\s")
+
+# usage: words, truncated = readWordList(<wordsAddr>, [<maxWords>], [<maxBytes>], [<reader>])
+# read the strings of a WORD_LIST linked list. Reading stops after <maxWords> words or after <maxBytes> bytes of word text and
+# <truncated> is set if there were more words.
+def readWordList(wordsAddr, maxWords=0, maxBytes=0, reader=None):
+	reader = reader or BashMemReader()
+	wl = bashLayout('WORD_LIST')
+	wdWordOffset = bashLayout('WORD_DESC').offsets['word']
+	nextOffset = wl.offsets['next']
+	wordOffset = wl.offsets['word']
+
+	words = []
+	byteCount = 0
+	cur = wordsAddr
+	while cur:
+		if (maxWords and len(words) >= maxWords) or (maxBytes and byteCount >= maxBytes):
+			return words, True
+		node = reader.read(cur, wl.sizeof)
+		wordDesc = reader.ptrAt(node, wordOffset)
+		text = ""
+		if wordDesc:
+			wordPtr = reader.readPtr(wordDesc + wdWordOffset)
+			if wordPtr:
+				text, truncated = reader.readCString(wordPtr, (maxBytes - byteCount) if maxBytes else 0)
+				if truncated:
+					words.append(text+"...")
+					return words, True
+		words.append(text)
+		byteCount += len(text)
+		cur = reader.ptrAt(node, nextOffset)
+	return words, False
+
+# usage: for index, valuePtr in iterBashArray(<arrayAddr>, [<limit>], [<reader>])
+# iterate the elements of a bash indexed ARRAY in index order. bash stores them in a circular, doubly linked list with a sentinel
+# head node (or, when built with ALT_ARRAY_IMPLEMENTATION, in a vector of element pointers). The values are yielded as char *
+# addresses so that the caller decides which strings to read.
+def iterBashArray(arrayAddr, limit=0, reader=None):
+	reader = reader or BashMemReader()
+	arrayLayout = bashLayout('ARRAY')
+	elLayout = bashLayout('ARRAY_ELEMENT')
+	if not arrayAddr:
+		return
+	arrayBuf = reader.read(arrayAddr, arrayLayout.sizeof)
+	count = 0
 
-def ShellVar_getI(vVar,index):
-	vArray = vVar['value']
-	return BGGetValue(gdb.parse_and_eval('array_reference({}, {})'.format(BGPtrCast("ARRAY *", vArray), index)))
+	if 'head' not in arrayLayout.offsets:
+		elements = reader.ptrAt(arrayBuf, arrayLayout.offsets['elements'])
+		first = reader.intAt(arrayBuf, arrayLayout, 'first_index')
+		last  = reader.intAt(arrayBuf, arrayLayout, 'max_index')
+		if not elements or last < first:
+			return
+		ptrSize = reader.ptr.size
+		vector = reader.read(elements + first*ptrSize, (last-first+1)*ptrSize)
+		for i in range(last-first+1):
+			el = reader.ptrAt(vector, i*ptrSize)
+			if el:
+				if limit and count >= limit:
+					return
+				elBuf = reader.read(el, elLayout.sizeof)
+				yield reader.intAt(elBuf, elLayout, 'ind'), reader.ptrAt(elBuf, elLayout.offsets['value'])
+				count += 1
+		return
 
+	head = reader.ptrAt(arrayBuf, arrayLayout.offsets['head'])
+	if not head:
+		return
+	el = reader.readPtr(head + elLayout.offsets['next'])
+	while el and el != head:
+		if limit and count >= limit:
+			return
+		elBuf = reader.read(el, elLayout.sizeof)
+		yield reader.intAt(elBuf, elLayout, 'ind'), reader.ptrAt(elBuf, elLayout.offsets['value'])
+		count += 1
+		el = reader.ptrAt(elBuf, elLayout.offsets['next'])
+
+# return the number of elements in a bash indexed ARRAY without walking it
+def bashArrayCount(arrayAddr, reader=None):
+	if not arrayAddr:
+		return 0
+	reader = reader or BashMemReader()
+	arrayLayout = bashLayout('ARRAY')
+	return reader.intAt(reader.read(arrayAddr, arrayLayout.sizeof), arrayLayout, 'num_elements')
+
+# usage: text = bashArrayReference(<arrayAddr>, <index>, [<reader>])
+# the native equivalent of bash's array_reference(). Like bash, the walk starts at the 'lastref' element when it is at or before
+# <index> so that sequential access does not rescan the list. Returns None if there is no element at <index>
+def bashArrayReference(arrayAddr, index, reader=None):
+	reader = reader or BashMemReader()
+	arrayLayout = bashLayout('ARRAY')
+	elLayout = bashLayout('ARRAY_ELEMENT')
+	if not arrayAddr:
+		return None
+	if 'head' not in arrayLayout.offsets:
+		for ind, valuePtr in iterBashArray(arrayAddr, 0, reader):
+			if ind == index:
+				return reader.readCString(valuePtr)[0] if valuePtr else ""
+		return None
+
+	arrayBuf = reader.read(arrayAddr, arrayLayout.sizeof)
+	head = reader.ptrAt(arrayBuf, arrayLayout.offsets['head'])
+	if not head or index > reader.intAt(arrayBuf, arrayLayout, 'max_index'):
+		return None
+	el = reader.ptrAt(arrayBuf, arrayLayout.offsets['lastref'])
+	if el and el != head:
+		elBuf = reader.read(el, elLayout.sizeof)
+		if reader.intAt(elBuf, elLayout, 'ind') > index:
+			el = reader.readPtr(head + elLayout.offsets['next'])
+	else:
+		el = reader.readPtr(head + elLayout.offsets['next'])
+	while el and el != head:
+		elBuf = reader.read(el, elLayout.sizeof)
+		ind = reader.intAt(elBuf, elLayout, 'ind')
+		if ind == index:
+			valuePtr = reader.ptrAt(elBuf, elLayout.offsets['value'])
+			return reader.readCString(valuePtr)[0] if valuePtr else ""
+		if ind > index:
+			return None
+		el = reader.ptrAt(elBuf, elLayout.offsets['next'])
+	return None
+
+# usage: for keyPtr, dataPtr in iterBashHashTable(<tableAddr>, [<limit>], [<reader>])
+# iterate the entries of a bash HASH_TABLE (used for assoc arrays and variable contexts). The bucket vector is read in one
+# block and then each bucket's chain is followed.
+def iterBashHashTable(tableAddr, limit=0, reader=None):
+	reader = reader or BashMemReader()
+	tableLayout = bashLayout('HASH_TABLE')
+	bucketLayout = bashLayout('BUCKET_CONTENTS')
+	if not tableAddr:
+		return
+	tableBuf = reader.read(tableAddr, tableLayout.sizeof)
+	bucketArray = reader.ptrAt(tableBuf, tableLayout.offsets['bucket_array'])
+	nbuckets = reader.intAt(tableBuf, tableLayout, 'nbuckets')
+	if not bucketArray or nbuckets <= 0 or not reader.intAt(tableBuf, tableLayout, 'nentries'):
+		return
+	ptrSize = reader.ptr.size
+	buckets = reader.read(bucketArray, nbuckets*ptrSize)
+	count = 0
+	for i in range(nbuckets):
+		item = reader.ptrAt(buckets, i*ptrSize)
+		while item:
+			if limit and count >= limit:
+				return
+			itemBuf = reader.read(item, bucketLayout.sizeof)
+			yield reader.ptrAt(itemBuf, bucketLayout.offsets['key']), reader.ptrAt(itemBuf, bucketLayout.offsets['data'])
+			count += 1
+			item = reader.ptrAt(itemBuf, bucketLayout.offsets['next'])
+
+# return the number of entries in a bash HASH_TABLE without walking it
+def bashHashTableCount(tableAddr, reader=None):
+	if not tableAddr:
+		return 0
+	reader = reader or BashMemReader()
+	tableLayout = bashLayout('HASH_TABLE')
+	return reader.intAt(reader.read(tableAddr, tableLayout.sizeof), tableLayout, 'nentries')
+
+# usage: for ctxAddr, ctxBuf in iterBashVarContexts(<shellVariablesAddr>, [<reader>])
+# walk the VAR_CONTEXT chain from the innermost context (the value of bash's 'shell_variables') down to global_variables
+def iterBashVarContexts(ctxAddr, reader=None):
+	reader = reader or BashMemReader()
+	ctxLayout = bashLayout('VAR_CONTEXT')
+	seen = set()
+	while ctxAddr and ctxAddr not in seen:
+		seen.add(ctxAddr)
+		ctxBuf = reader.read(ctxAddr, ctxLayout.sizeof)
+		yield ctxAddr, ctxBuf
+		ctxAddr = reader.ptrAt(ctxBuf, ctxLayout.offsets['down'])
+
+# usage: var = readShellVar(<varAddr>, [<reader>], [<maxBytes>], [<maxElements>])
+# read a SHELL_VAR into a dict with name, attributes, context, value and valuePtr. array values are lists of [index, value] and
+# assoc values are lists of [key, value]. Function values are not read (value is None).
+def readShellVar(varAddr, reader=None, maxBytes=0, maxElements=0):
+	reader = reader or BashMemReader()
+	varLayout = bashLayout('SHELL_VAR')
+	varBuf = reader.read(varAddr, varLayout.sizeof)
+	namePtr = reader.ptrAt(varBuf, varLayout.offsets['name'])
+	valuePtr = reader.ptrAt(varBuf, varLayout.offsets['value'])
+	attributes = reader.intAt(varBuf, varLayout, 'attributes')
+	var = {
+		'name':       reader.readCString(namePtr)[0] if namePtr else "",
+		'attributes': attributes,
+		'context':    reader.intAt(varBuf, varLayout, 'context'),
+		'valuePtr':   valuePtr,
+		'value':      None
+	}
+	def readStr(addr):
+		if not addr:
+			return ""
+		text, truncated = reader.readCString(addr, maxBytes)
+		return text + "..." if truncated else text
+
+	if attributes & att_function:
+		pass
+	elif attributes & att_assoc:
+		var['value'] = [[readStr(keyPtr), readStr(dataPtr)] for keyPtr, dataPtr in iterBashHashTable(valuePtr, maxElements, reader)]
+	elif attributes & att_array:
+		var['value'] = [[ind, readStr(elPtr)] for ind, elPtr in iterBashArray(valuePtr, maxElements, reader)]
+	else:
+		var['value'] = readStr(valuePtr)
+	return var
+
+# usage: for ctxName, var in iterVisibleShellVars(<shellVariablesAddr>, [<reader>], [<maxBytes>], [<maxElements>])
+# yield each variable that a script would see at this point. A name in an inner (function local) context hides the same name in
+# outer contexts. Variables that are declared but not set (att_invisible) are skipped.
+def iterVisibleShellVars(shellVariablesAddr, reader=None, maxBytes=0, maxElements=0):
+	reader = reader or BashMemReader()
+	ctxLayout = bashLayout('VAR_CONTEXT')
+	varLayout = bashLayout('SHELL_VAR')
+	seen = set()
+	for ctxAddr, ctxBuf in iterBashVarContexts(shellVariablesAddr, reader):
+		ctxNamePtr = reader.ptrAt(ctxBuf, ctxLayout.offsets['name'])
+		ctxName = reader.readCString(ctxNamePtr)[0] if ctxNamePtr else "global"
+		for keyPtr, varAddr in iterBashHashTable(reader.ptrAt(ctxBuf, ctxLayout.offsets['table']), 0, reader):
+			if not varAddr:
+				continue
+			name = reader.readCString(keyPtr)[0] if keyPtr else ""
+			if name in seen:
+				continue
+			seen.add(name)
+			if reader.readInt(varAddr + varLayout.offsets['attributes'], varLayout.sizes['attributes']) & att_invisible:
+				continue
+			yield ctxName, readShellVar(varAddr, reader, maxBytes, maxElements)
+
+# the FNV-1 string hash that bash's hashlib.c uses to choose a bucket
+def bashHashString(s):
+	h = 2166136261
+	for ch in s.encode('utf-8'):
+		h = ((h * 16777619) & 0xffffffff) ^ ch
+	return h
+
+# usage: dataPtr = bashHashSearch(<tableAddr>, <name>, [<reader>])
+# the native equivalent of bash's hash_search(). Only the one bucket that <name> hashes to is read
+def bashHashSearch(tableAddr, name, reader=None):
+	reader = reader or BashMemReader()
+	tableLayout = bashLayout('HASH_TABLE')
+	bucketLayout = bashLayout('BUCKET_CONTENTS')
+	if not tableAddr:
+		return None
+	tableBuf = reader.read(tableAddr, tableLayout.sizeof)
+	bucketArray = reader.ptrAt(tableBuf, tableLayout.offsets['bucket_array'])
+	nbuckets = reader.intAt(tableBuf, tableLayout, 'nbuckets')
+	if not bucketArray or nbuckets <= 0:
+		return None
+	khash = bashHashString(name)
+	item = reader.readPtr(bucketArray + (khash & (nbuckets-1)) * reader.ptr.size)
+	while item:
+		itemBuf = reader.read(item, bucketLayout.sizeof)
+		if reader.intAt(itemBuf, bucketLayout, 'khash', signed=False) == khash:
+			keyPtr = reader.ptrAt(itemBuf, bucketLayout.offsets['key'])
+			if keyPtr and reader.readCString(keyPtr)[0] == name:
+				return reader.ptrAt(itemBuf, bucketLayout.offsets['data'])
+		item = reader.ptrAt(itemBuf, bucketLayout.offsets['next'])
+	return None
+
+# usage: varAddr = findShellVar(<shellVariablesAddr>, <name>, [<reader>])
+# the native equivalent of bash's find_variable() without the dynamic variable and nameref handling. Returns the address of
+# the SHELL_VAR or None
+def findShellVar(shellVariablesAddr, name, reader=None):
+	reader = reader or BashMemReader()
+	ctxLayout = bashLayout('VAR_CONTEXT')
+	for ctxAddr, ctxBuf in iterBashVarContexts(shellVariablesAddr, reader):
+		varAddr = bashHashSearch(reader.ptrAt(ctxBuf, ctxLayout.offsets['table']), name, reader)
+		if varAddr:
+			return varAddr
+	return None
+
+# BashStackReader reads the bash (script level) call stack from the FUNCNAME, BASH_SOURCE, BASH_LINENO, BASH_ARGC and BASH_ARGV
+# arrays. It is constructed on the gdb thread, which resolves the layouts and symbol addresses it needs, and after that read()
+# only uses the BashMemReader that it is given so it also works with readers that do not go through gdb.
+class BashStackReader:
+	def __init__(self):
+		self.shellVariablesAddr = bashMeta.symbolAddr('shell_variables')
+		self.lineNumberAddr     = bashMeta.symbolAddr('line_number')
+		self.lineNumberSize     = bashMeta.symbol('line_number').type.sizeof
+		self.dollarVarsAddr     = bashMeta.symbolAddr('dollar_vars')
+		self.restOfArgsAddr     = bashMeta.symbolAddr('rest_of_args')
+		self.varValueOffset     = bashLayout('SHELL_VAR').offsets['value']
+		for typeName in ['VAR_CONTEXT', 'HASH_TABLE', 'BUCKET_CONTENTS', 'ARRAY', 'ARRAY_ELEMENT', 'WORD_LIST', 'WORD_DESC']:
+			bashLayout(typeName)
+
+	# return the elements of the bash array variable <name> as a list indexed from 0
+	def _readArray(self, reader, name, limit):
+		varAddr = findShellVar(reader.readPtr(self.shellVariablesAddr), name, reader)
+		if not varAddr:
+			return []
+		values = []
+		for ind, valuePtr in iterBashArray(reader.readPtr(varAddr + self.varValueOffset), limit, reader):
+			while len(values) < ind:
+				values.append("")
+			values.append(reader.readCString(valuePtr)[0] if valuePtr else "")
+		return values
+
+	# usage: frames = stackReader.read(<reader>, [<maxFrames>], [<maxArgs>])
+	# returns a list of {level, func, source, line, args} with the innermost bash function first. args is None for frames whose
+	# arguments are not available (bash only records them in BASH_ARGV when extdebug is set)
+	def read(self, reader, maxFrames=0, maxArgs=0):
+		funcNames   = self._readArray(reader, 'FUNCNAME', maxFrames)
+		sources     = self._readArray(reader, 'BASH_SOURCE', maxFrames)
+		lineNumbers = self._readArray(reader, 'BASH_LINENO', maxFrames)
+		depth = max(len(funcNames), len(sources), 1)
+		if maxFrames:
+			depth = min(depth, maxFrames)
+
+		frames = []
+		for i in range(depth):
+			frames.append({
+				'level':  i,
+				'func':   funcNames[i] if i < len(funcNames) else 'main',
+				'source': sources[i] if i < len(sources) else "",
+				'line':   reader.readInt(self.lineNumberAddr, self.lineNumberSize) if i == 0 else (lineNumbers[i-1] if i-1 < len(lineNumbers) else ""),
+				'args':   None
+			})
+		if maxArgs is None:
+			return frames
+
+		frames[0]['args'] = self._readPositionalArgs(reader, maxArgs)
+
+		argCounts = self._readArray(reader, 'BASH_ARGC', maxFrames)
+		if len(argCounts) >= depth:
+			argv = self._readArray(reader, 'BASH_ARGV', 0)
+			offset = 0
+			for i in range(depth):
+				try:
+					argc = int(argCounts[i])
+				except ValueError:
+					break
+				if i > 0:
+					args = argv[offset:offset+argc]
+					args.reverse()
+					frames[i]['args'] = args[0:maxArgs] if maxArgs else args
+				offset += argc
+		return frames
+
+	# return the names of the bash functions on the stack with the innermost first. This only reads FUNCNAME so it is cheaper
+	# than read() when the sources and line numbers are not needed
+	def readFuncNames(self, reader, maxFrames=0):
+		funcNames = self._readArray(reader, 'FUNCNAME', maxFrames) or ['main']
+		return funcNames[0:maxFrames] if maxFrames else funcNames
+
+	# return the line number of the bash command being executed
+	def currentLine(self, reader):
+		return reader.readInt(self.lineNumberAddr, self.lineNumberSize)
+
+	# return the script file of the bash command being executed (BASH_SOURCE[0])
+	def currentSource(self, reader):
+		varAddr = findShellVar(reader.readPtr(self.shellVariablesAddr), 'BASH_SOURCE', reader)
+		if not varAddr:
+			return ""
+		return bashArrayReference(reader.readPtr(varAddr + self.varValueOffset), 0, reader) or ""
+
+	# return the current positional parameters ($1...) from dollar_vars and rest_of_args
+	def _readPositionalArgs(self, reader, maxArgs):
+		ptrSize = reader.ptr.size
+		dollarVars = reader.read(self.dollarVarsAddr, 10*ptrSize)
+		args = []
+		for i in range(1, 10):
+			argPtr = reader.ptrAt(dollarVars, i*ptrSize)
+			if not argPtr:
+				return args
+			args.append(reader.readCString(argPtr)[0])
+		restOfArgs = reader.readPtr(self.restOfArgsAddr)
+		if restOfArgs:
+			words, truncated = readWordList(restOfArgs, (maxArgs-len(args)) if maxArgs else 0, 0, reader)
+			args.extend(words)
+		return args[0:maxArgs] if maxArgs else args
+
+# return the address of the WORD_LIST that <words> (a WORD_LIST or WORD_LIST * gdb.Value) refers to
+def _wordListAddr(words):
+	if words.type.strip_typedefs().code == gdb.TYPE_CODE_PTR:
+		return int(words)
+	if words.address is not None:
+		return int(words.address)
+	return None
 
 def WordList_toString(words):
-	s = ""
-	sep=""
-	cur = words
-	count = 0
+	words = words if isinstance(words, int) else _wordListAddr(words)
+	if words is None:
+		return "<WORD_LIST value is not in memory>"
+	wordList = []
 	try:
-		while cur:
-			word = cur['word']['word'].string()
-			if re.search("\s",word):
-				word = "'{}'".format(word)
-			s = s + sep + word
-			sep=" "
-			cur = cur['next'] if cur['next'] else None
-			count = count + 1
-		return s;
+		wordList, truncated = readWordList(words, bgWordListMaxWords.value, bgWordListMaxBytes.value)
+		s = " ".join(["'{}'".format(word) if _whitespaceRe.search(word) else word for word in wordList])
+		return s + " ..." if truncated else s
 	except Exception as e:
-		bgtrace("WordList_toString: caught exception after {} words. words='{}'".format(count, s), traceback.format_exc())
-		return s+" <"+str(e)+">"
+		bgtracef("WordList_toString: caught exception after {} words. words='{}'\n{}", len(wordList), wordList, traceback.format_exc(), level=TRACE_WARN, category='printers')
+		return " ".join(wordList)+" <"+str(e)+">"
 
 
 
@@ -272,6 +1145,136 @@ def ShellCmd_typeToString(cmdType):
 
 
 
+# BGLruCache is a bounded, least recently used cache with hit/miss statistics
+class BGLruCache:
+	def __init__(self, maxSize):
+		import collections
+		self.entries = collections.OrderedDict()
+		self.maxSize = maxSize
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key):
+		entry = self.entries.get(key)
+		if entry is None:
+			self.misses += 1
+		else:
+			self.hits += 1
+			self.entries.move_to_end(key)
+		return entry
+
+	def put(self, key, entry):
+		self.entries[key] = entry
+		self.entries.move_to_end(key)
+		while len(self.entries) > self.maxSize:
+			self.entries.popitem(last=False)
+			self.evictions += 1
+
+	def resize(self, maxSize):
+		self.maxSize = maxSize
+		while len(self.entries) > self.maxSize:
+			self.entries.popitem(last=False)
+			self.evictions += 1
+
+	def clear(self, event=None):
+		self.entries.clear()
+
+	def stats(self):
+		return {'size': len(self.entries), 'maxSize': self.maxSize, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+# bash does not modify a COMMAND tree after it is parsed so its summary can be reused until the memory is freed and reused. The
+# cache is keyed by (inferior, address, struct type) and the limits that shape the summary (bgSummaryMaxChars,
+# bgSummaryMaxNodes, bgWordListMaxWords and bgWordListMaxBytes) so that changing a limit does not return stale text. When
+# bgSummaryCacheVerify is on, the bytes of the node itself are kept as a fingerprint and a hit is only used if the node still
+# has the same contents. The cache is cleared when the inferior exits or execs (which loads a new objfile).
+_cmdSummaryCache = BGLruCache(4096)
+
+def _cachedCmdSummary(cmdAddr, dynType, compute):
+	if not cmdAddr or not bgSummaryCacheSize.value:
+		return compute()
+	key = (gdb.selected_inferior().num, cmdAddr, dynType, bgSummaryMaxChars.value, bgSummaryMaxNodes.value, bgWordListMaxWords.value, bgWordListMaxBytes.value)
+	fingerprint = None
+	if bgSummaryCacheVerify.value:
+		try:
+			fingerprint = BashMemReader().read(cmdAddr, bashMeta.type(dynType).sizeof)
+		except Exception:
+			return compute()
+	entry = _cmdSummaryCache.get(key)
+	if entry is not None and entry[1] == fingerprint:
+		return entry[0]
+	summary = compute()
+	_cmdSummaryCache.put(key, (summary, fingerprint))
+	return summary
+
+# BGStopCache memoizes results that can not change while the inferior is stopped. An IDE asks for the same frame names and
+# pretty-printer strings many times during one stop (stack view, variables view, hovers) so the first answer is kept until
+# the inferior is resumed. It is cleared on the stop, cont and exited events so nothing survives into the next stop. It is
+# also cleared when the inferior changes during a stop without being resumed: a 'set var' or an MI -data-write-memory
+# (memory_changed, register_changed) or a function called in the inferior from a print or watch expression (inferior_call).
+class BGStopCache:
+	def __init__(self):
+		self.entries = {}
+		self.hits = 0
+		self.misses = 0
+		self.clears = 0
+
+	def get(self, key, compute):
+		try:
+			value = self.entries[key]
+			self.hits += 1
+			return value
+		except KeyError:
+			self.misses += 1
+		value = compute()
+		self.entries[key] = value
+		return value
+
+	def clear(self, event=None):
+		if self.entries:
+			self.entries.clear()
+			self.clears += 1
+
+	def stats(self):
+		return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'clears': self.clears}
+
+_stopCache = BGStopCache()
+
+bgConnect(gdb.events.stop, _stopCache.clear)
+bgConnect(gdb.events.cont, _stopCache.clear)
+bgConnect(gdb.events.exited, _stopCache.clear)
+bgConnect(gdb.events.memory_changed, _stopCache.clear)
+bgConnect(gdb.events.register_changed, _stopCache.clear)
+bgConnect(gdb.events.inferior_call, _stopCache.clear)
+
+# the identity of a frame for the life of a stop. frame.level() is only available in gdb 11+. pc and sp identify a frame
+# even when the same function is on the stack more than once.
+def _frameKey(frame):
+	if hasattr(frame, 'level'):
+		return (gdb.selected_thread().num, frame.level(), frame.pc())
+	return (gdb.selected_thread().num, frame.pc(), int(frame.read_register('sp')))
+
+# the identity of a printed value for the life of a stop. Pointer printers are keyed on the address they point to and struct
+# printers on the address of the struct. Values that are not in inferior memory (e.g. computed) return None and are not cached.
+def _valueKey(val, tag):
+	if val.type.code == gdb.TYPE_CODE_PTR:
+		addr = int(val)
+	elif val.address is not None:
+		addr = int(val.address)
+	else:
+		return None
+	return (gdb.selected_inferior().num, addr, tag)
+
+# call compute() once per stop for the value <val> as printed by the printer identified by <tag>
+def _stopCachedString(val, tag, compute):
+	try:
+		key = _valueKey(val, tag)
+	except gdb.error:
+		key = None
+	if key is None:
+		return compute()
+	return _stopCache.get(key, compute)
+
 def CmdDynStruct_getSummaryText(vTypedCmd, dynType=None):
 	# bgtrace("$$$ here")
 	# bgtrace(vTypedCmd, vTypedCmd.type)
@@ -279,162 +1282,225 @@ def CmdDynStruct_getSummaryText(vTypedCmd, dynType=None):
 		dynType = str(vTypedCmd.type)
 		dynType = re.sub(" \*$","", dynType)
 		# bgtrace("$$$ dynType='"+dynType+"'")
-
+	cmdAddr = int(vTypedCmd.address) if vTypedCmd.address is not None else None
+	return _cachedCmdSummary(cmdAddr, dynType, lambda: _CmdDynStruct_getSummaryText(vTypedCmd, dynType))
+
+# return the typed struct (e.g. SIMPLE_COM) that a COMMAND or COMMAND * gdb.Value points to and its struct type name
+def ShellCmd_getTypedCmd(vCmd):
+	dynType = ShellCmd_typeToString(bashMeta.enumNames('enum command_type').get(int(vCmd['type']), ''));
+	return vCmd['value'].cast(bashMeta.ptrType(dynType)).dereference(), dynType
+
+# connectors for ';', '&', '|' and newline are stored as the character, '&&' and '||' as parser tokens
+def ShellCmd_connectorToString(connector):
+	if connector == 10:
+		return ';'
+	if connector < 256:
+		return chr(connector)
+	return getBashToken(connector)
+
+_SUMMARY_ELIDED = '... '
+
+# usage: summary = _CmdDynStruct_getSummaryText(<vTypedCmd>, <dynType>)
+# build the one line summary of a command struct. The tree is walked with an explicit stack instead of recursion because the
+# CONNECTION chains of long scripts and pipelines can be thousands of levels deep. Each stack item is either a str to add to
+# the summary or a ('cmd', <COMMAND value>) or ('typed', <typed struct value>, <dynType>) node to expand.
+#
+# The summary is built from right to left. bash's parser builds lists like 'a; b; c' as left-deep CONNECTION trees
+# (((a;b);c) so walking right to left yields one simple command per CONNECTION node read, where walking left to right would
+# have to read the whole left spine before producing any text. When the summary reaches bgSummaryMaxChars characters or
+# bgSummaryMaxNodes nodes, no more inferior memory is read and the elision marker is put in front of what was collected. The
+# text is cut on a part boundary so that no word is cut in half. If even the rightmost part does not fit, its head is kept
+# and the marker is put after it.
+def _CmdDynStruct_getSummaryText(vTypedCmd, dynType):
+	maxChars = bgSummaryMaxChars.value
+	maxNodes = bgSummaryMaxNodes.value
+	parts = []
+	charCount = 0
+	nodeCount = 0
+	stack = [('typed', vTypedCmd, dynType)]
+	while stack:
+		item = stack.pop()
+		if isinstance(item, str):
+			parts.append(item)
+			charCount += len(item)
+			if maxChars and charCount >= maxChars:
+				break
+			continue
+
+		if (maxNodes and nodeCount >= maxNodes):
+			stack.append(item)
+			break
+		nodeCount += 1
+		try:
+			if item[0] == 'cmd':
+				if not item[1]:
+					continue
+				vTyped, nodeType = ShellCmd_getTypedCmd(item[1])
+			else:
+				vTyped, nodeType = item[1], item[2]
+			# the parts are pushed in output order so that the rightmost is popped first
+			stack.extend(_CmdDynStruct_summaryParts(vTyped, nodeType))
+		except Exception as e:
+			parts.append('<error: {}>'.format(str(e)))
+
+	elided = bool(stack)
+	if maxChars and charCount > maxChars:
+		# parts are in right to left order here. keep the whole parts that fit from the right
+		keptCount = 0
+		keptChars = 0
+		while keptCount < len(parts) and keptChars + len(parts[keptCount]) <= maxChars:
+			keptChars += len(parts[keptCount])
+			keptCount += 1
+		if not keptCount:
+			return parts[0][0:maxChars].rstrip() + ' ...'
+		del parts[keptCount:]
+		elided = True
+
+	parts.reverse()
+	summary = "".join(parts)
+	if elided:
+		summary = _SUMMARY_ELIDED + summary.lstrip()
+	return summary
+
+# return the list of strings and child nodes that make up the summary of one command struct
+def _CmdDynStruct_summaryParts(vTypedCmd, dynType):
 	if 'FOR_COM'          == dynType:
-		return 'for {} ...'.format(vTypedCmd['name']['word'].string())
+		return ['for {} ...'.format(vTypedCmd['name']['word'].string())]
 	elif 'CASE_COM'         == dynType:
-		return 'case {} ...'.format(vTypedCmd['word']['word'].string())
+		return ['case {} ...'.format(vTypedCmd['word']['word'].string())]
 	elif 'WHILE_COM'        == dynType:
-		return 'while {}; ...'.format( ShellCmd_getSummaryText(vTypedCmd['test']) )
+		return ['while ', ('cmd', vTypedCmd['test']), '; ...']
 	elif 'IF_COM'           == dynType:
-		return 'if {}; ...'.format( ShellCmd_getSummaryText(vTypedCmd['test']) )
+		return ['if ', ('cmd', vTypedCmd['test']), '; ...']
 	elif 'SIMPLE_COM'       == dynType:
-		return WordList_toString(vTypedCmd['words'])
+		return [WordList_toString(vTypedCmd['words'])]
 	elif 'SELECT_COM'       == dynType:
-		return 'for {} ...'.format(vTypedCmd['name']['word'].string())
+		return ['for {} ...'.format(vTypedCmd['name']['word'].string())]
 	elif 'CONNECTION'   == dynType:
-		try:
-			return '{} {} {}'.format(
-				ShellCmd_getSummaryText(vTypedCmd['first']),
-				getBashToken( int(vTypedCmd['connector']) ),
-				ShellCmd_getSummaryText(vTypedCmd['second'])
-			)
-		except Exception as e:
-			return '<error: {}>'.format(str(e))
+		return [
+			('cmd', vTypedCmd['first']),
+			' {} '.format(ShellCmd_connectorToString(int(vTypedCmd['connector']))),
+			('cmd', vTypedCmd['second'])
+		]
 	elif 'FUNCTION_DEF' == dynType:
-		return 'function {}() \{...} ...'.format(vTypedCmd['name']['word'].string())
+		return ['function {}() {{...}} ...'.format(vTypedCmd['name']['word'].string())]
 	elif 'GROUP_COM'        == dynType:
-		return 'grouped cmd block {...}';
+		return ['{ ', ('cmd', vTypedCmd['command']), '; }']
 	elif 'ARITH_COM'        == dynType:
-		return WordList_toString(vTypedCmd['exp'])
+		return [WordList_toString(vTypedCmd['exp'])]
 	elif 'COND_COM'         == dynType:
-		return '<expr> {} <expr>'.format(vTypedCmd['op']['word'].string())
+		return ['<expr> {} <expr>'.format(vTypedCmd['op']['word'].string())]
 	elif 'ARITH_FOR_COM'    == dynType:
-		return 'for (( {}; {}; {} ))'.format(
+		return ['for (( {}; {}; {} ))'.format(
 			WordList_toString(vTypedCmd['init']),
 			WordList_toString(vTypedCmd['test']),
 			WordList_toString(vTypedCmd['step'])
-		)
+		)]
 	elif 'SUBSHELL_COM'     == dynType:
-		return '$(...)'
+		return ['$(...)']
 	elif 'COPROC_COM'       == dynType:
-		return '<creating coproc>'
+		return ['<creating coproc>']
 
-	return "<unknown cmd struct type '"+dynType+"'"
+	return ["<unknown cmd struct type '"+dynType+"'"]
 
+# <vCmd> can be a COMMAND or a COMMAND * gdb.Value
 def ShellCmd_getSummaryText(vCmd):
-	dynType = ShellCmd_typeToString(BGGetValue(vCmd['type']));
-	vTypedCmd = vCmd['value'].cast(gdb.lookup_type(dynType).pointer()).dereference()
-	return CmdDynStruct_getSummaryText(vTypedCmd)
-
-# experimental -- not yet used
-def getAltStackData():
-	vFUNC = gdb.parse_and_eval('ShellVar_find("FUNCNAME")')
-
-	frm = gdb.newest_frame()
-	count = 0
-	while frm:
-		bgtrace("   frame {}".format(frm.function()))
-		frm = frm.older()
-		count = count +1
-
-	f0 = ShellVar_getI(vFUNC, 0)
-	bgtrace("f0="+f0)
-
-	s = 'one\ntwo\nthree\n'
-	bgtrace(s, indentLevel=1)
-
-	# if vFUNC:
-	# 	print("yes "+str(int(vFUNC)))
-	# 	print("yes "+str(vFUNC.address))
-	# 	print("yes "+str(vFUNC.dereference().address))
-	# else:
-	# 	print("no")
-	# cmd = "array_reference((ARRAY *)("+str(int(vFUNC))+")->value, 0)"
-	# print(cmd)
-	# f0=gdb.parse_and_eval(cmd)
-	# if f0:
-	# 	print("f0="+str(f0))
-	# else:
-	# 	print("didnt work f0 is bad")
-
-# class MIEcho(gdb.MICommand):
-#     """Echo arguments passed to the command."""
-#
-#     def __init__(self, name, mode):
-#         self._mode = mode
-#         super(MIEcho, self).__init__(name)
-#
-#     def invoke(self, argv):
-#         if self._mode == 'dict':
-#             return { 'dict': { 'argv' : argv } }
-#         elif self._mode == 'list':
-#             return { 'list': argv }
-#         else:
-#             return { 'string': ", ".join(argv) }
-#
-#
-# MIEcho("-echo-dict", "dict")
-# MIEcho("-echo-list", "list")
-# MIEcho("-echo-string", "string")
-
-
-
+	if vCmd.type.code == gdb.TYPE_CODE_PTR:
+		cmdAddr = int(vCmd)
+	else:
+		cmdAddr = int(vCmd.address) if vCmd.address is not None else None
+	return _cachedCmdSummary(cmdAddr, 'COMMAND', lambda: _CmdDynStruct_getSummaryText(*ShellCmd_getTypedCmd(vCmd)))
+
+# SHELL_VAR attribute flags from bash variables.h (it seems that gdb can not access defines the way I am building bash)
+att_exported  = 0x0000001
+att_readonly  = 0x0000002
+att_array     = 0x0000004
+att_function  = 0x0000008
+att_integer   = 0x0000010
+att_local     = 0x0000020
+att_assoc     = 0x0000040
+att_trace     = 0x0000080
+att_uppercase = 0x0000100
+att_lowercase = 0x0000200
+att_capcase   = 0x0000400
+att_nameref   = 0x0000800
+att_invisible = 0x0001000
+
+_shellVarAttrNames = [
+	(att_exported,  'exported'),
+	(att_readonly,  'readonly'),
+	(att_array,     'array'),
+	(att_function,  'function'),
+	(att_integer,   'integer'),
+	(att_local,     'local'),
+	(att_assoc,     'assoc'),
+	(att_trace,     'trace'),
+	(att_uppercase, 'uppercase'),
+	(att_lowercase, 'lowercase'),
+	(att_capcase,   'capcase'),
+	(att_nameref,   'nameref')
+]
+
+def ShellVar_attrToString(attributes):
+	return "".join([name+"," for flag, name in _shellVarAttrNames if attributes & flag])
+
+def ShellVar_typeFromAttr(attributes):
+	type = 'simple'
+	if (attributes & att_function): type = 'function'
+	if (attributes & att_array):    type = 'array'
+	if (attributes & att_assoc):    type = 'assoc'
+	if (attributes & att_nameref):  type = 'nameref'
+	return type
+
+# Arrays and assoc arrays are printed as their elements, with the 'array' and 'map' display hints. The element count is in
+# to_string so it is known before any element is read. children() is a generator that yields char * gdb.Values without reading
+# the strings so gdb only reads the elements it shows. The CLI stops pulling children at the 'print elements' limit and MI
+# -var-list-children stops at the end of the requested range. Other variables are printed as their name, type, attr and value.
 class ShellVarPrinter:
 	def __init__(self,val):
 		self.val = val
+		try:
+			self.varType = ShellVar_typeFromAttr(int(self.val['attributes']))
+		except:
+			self.varType = 'simple'
 
 	def to_string(self):
+		return _stopCachedString(self.val, 'SHELL_VAR', self._toString)
+
+	def _toString(self):
 		try:
-			return self.val['name'].string()
+			name = self.val['name'].string()
+			if self.varType == 'array':
+				return "{} (array, {} elements)".format(name, bashArrayCount(int(self.val['value'])))
+			if self.varType == 'assoc':
+				return "{} (assoc, {} elements)".format(name, bashHashTableCount(int(self.val['value'])))
+			return name
 		except:
-			bgtrace("ShellVarPrinter::to_string(): caught exception", traceback.format_exc())
+			bgtrace("ShellVarPrinter::to_string(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
 			return "<error>"
 
 	def children(self):
 		try:
-			# from bash variable.h (it seems that gdb can not access defines the way I am building bash)
-			att_exported  = 0x0000001
-			att_readonly  = 0x0000002
-			att_array     = 0x0000004
-			att_function  = 0x0000008
-			att_integer   = 0x0000010
-			att_local     = 0x0000020
-			att_assoc     = 0x0000040
-			att_trace     = 0x0000080
-			att_uppercase = 0x0000100
-			att_lowercase = 0x0000200
-			att_capcase   = 0x0000400
-			att_nameref   = 0x0000800
+			if self.varType == 'array':
+				charPtr = bashMeta.ptrType('char')
+				for ind, valuePtr in iterBashArray(int(self.val['value'])):
+					yield '[{}]'.format(ind), gdb.Value(valuePtr).cast(charPtr)
+				return
+			if self.varType == 'assoc':
+				charPtr = bashMeta.ptrType('char')
+				for keyPtr, dataPtr in iterBashHashTable(int(self.val['value'])):
+					yield 'key', gdb.Value(keyPtr).cast(charPtr)
+					yield 'value', gdb.Value(dataPtr).cast(charPtr)
+				return
 
 			yield 'name',self.val['name'].string()
-
-			type = 'simple'
-			if (self.val['attributes'] & att_function): type = 'function'
-			if (self.val['attributes'] & att_array):    type = 'array'
-			if (self.val['attributes'] & att_assoc):    type = 'assoc'
-			if (self.val['attributes'] & att_nameref):  type = 'nameref'
-			yield 'type', type
-
-			attr = ""
-			if (self.val['attributes'] & att_exported):  attr = attr + 'exported,'
-			if (self.val['attributes'] & att_readonly):  attr = attr + 'readonly,'
-			if (self.val['attributes'] & att_array):     attr = attr + 'array,'
-			if (self.val['attributes'] & att_function):  attr = attr + 'function,'
-			if (self.val['attributes'] & att_integer):   attr = attr + 'integer,'
-			if (self.val['attributes'] & att_local):     attr = attr + 'local,'
-			if (self.val['attributes'] & att_assoc):     attr = attr + 'assoc,'
-			if (self.val['attributes'] & att_trace):     attr = attr + 'trace,'
-			if (self.val['attributes'] & att_uppercase): attr = attr + 'uppercase,'
-			if (self.val['attributes'] & att_lowercase): attr = attr + 'lowercase,'
-			if (self.val['attributes'] & att_capcase):   attr = attr + 'capcase,'
-			if (self.val['attributes'] & att_nameref):   attr = attr + 'nameref,'
-			yield 'attr', attr
+			yield 'type', self.varType
+			yield 'attr', ShellVar_attrToString(int(self.val['attributes']))
 
 			value = ""
-			if (type == "simple"):   value = self.val['value'].string()
-			if (type == "nameref"):  value = self.val['value'].string()
-			if (type == "function"):
+			if (self.varType == "simple"):   value = self.val['value'].string()
+			if (self.varType == "nameref"):  value = self.val['value'].string()
+			if (self.varType == "function"):
 				pass
 				# funcType = gdb.lookup_type('COMMAND')
 				# func = self.val.cast(funcType)
@@ -442,11 +1508,14 @@ class ShellVarPrinter:
 			if (value != ""):
 				yield 'value', value
 		except:
-			bgtrace("ShellVarPrinter::children(): caught exception", traceback.format_exc())
-
+			bgtrace("ShellVarPrinter::children(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
 
-	def displayHint(self):
-		return 'map'
+	def display_hint(self):
+		if self.varType == 'array':
+			return 'array'
+		if self.varType == 'assoc':
+			return 'map'
+		return None
 
 
 
@@ -456,10 +1525,13 @@ class WordListPrinter:
 		#bgtrace("WordListPrinter addr =",val.address)
 
 	def to_string(self):
+		return _stopCachedString(self.val, 'WORD_LIST', self._toString)
+
+	def _toString(self):
 		try:
 			s = WordList_toString(self.val);
 		except:
-			bgtrace("WordListPrinter::to_string(): caught exception", traceback.format_exc())
+			bgtrace("WordListPrinter::to_string(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
 			s = '<error reading words>'
 		return s;
 
@@ -472,7 +1544,7 @@ class WordDescPrinter:
 		try:
 			return self.val['word'].string()
 		except Exception as e:
-			bgtrace("WordDescPrinter::to_string(): caught exception", traceback.format_exc())
+			bgtrace("WordDescPrinter::to_string(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
 			return str(e)
 
 
@@ -481,11 +1553,14 @@ class CommandPrinter:
 		self.val = val
 
 	def to_string(self):
+		return _stopCachedString(self.val, 'COMMAND', self._toString)
+
+	def _toString(self):
 		try:
 			self.cmdSummary = ShellCmd_getSummaryText(self.val);
 			return "'{}'".format(self.cmdSummary)
 		except:
-			bgtrace("CommandPrinter::to_string(): caught exception", traceback.format_exc())
+			bgtrace("CommandPrinter::to_string(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
 		# not returning seems to tell gdb to try the next pretty-printer
 
 	def children(self):
@@ -493,7 +1568,7 @@ class CommandPrinter:
 			self.typeStr = BGGetValue(self.val['type'])
 			return [ ("type",self.typeStr), ("flags",self.val['flags']), ("line",self.val['line'])]
 		except:
-			bgtrace("CommandPrinter::children(): caught exception", traceback.format_exc())
+			bgtrace("CommandPrinter::children(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
 
 class CmdDynStructPrinter:
 	def __init__(self, val, cmdTypeStr):
@@ -501,11 +1576,14 @@ class CmdDynStructPrinter:
 		self.cmdTypeStr = cmdTypeStr
 
 	def to_string(self):
+		return _stopCachedString(self.val, self.cmdTypeStr, self._toString)
+
+	def _toString(self):
 		try:
 			self.cmdSummary = CmdDynStruct_getSummaryText(self.val, self.cmdTypeStr);
 		except:
 			self.cmdSummary = "<error: evaluating command summary>"
-		bgtrace("self.cmdSummary='{}'".format(self.cmdSummary))
+		bgtracef("self.cmdSummary='{}'", self.cmdSummary, category='printers')
 		return "'{}'".format(self.cmdSummary)
 
 	def children(self):
@@ -535,10 +1613,7 @@ class PointerPrinter:
 		if typeStr == "PROCESS *" or re.search("void",typeStr) or re.search("\*\*$",typeStr):
 			return "0x{:x}".format(addrInt)
 
-		try:
-			gdb.selected_inferior().read_memory(self.val,1)
-		except:
-			bgtrace("PointerPrinter::to_string(): reading one byte threw exception", traceback.format_exc())
+		if not isReadableAddr(addrInt):
 			return "0x{:x} <invalid address>".format(addrInt)
 		try:
 			derefVal = self.val.dereference();
@@ -546,12 +1621,11 @@ class PointerPrinter:
 				return "0x{:x} <deref yielded another ptr so stopped>".format(addrInt)
 			# return the value which will recurse printy printer lookup
 			if bgShowPtrAddr.value:
-				bgtrace("!!! PointerPrinter temp self.val.type=",self.val.type, derefVal.type)
 				return "(0x{:x}) {}".format(addrInt, str(derefVal ) );
 			else:
 				return derefVal;
 		except:
-			bgtrace("PointerPrinter::to_string(): dereference() threw exception", traceback.format_exc())
+			bgtrace("PointerPrinter::to_string(): dereference() threw exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
 			return "0x{:x} <dereference failed>".format(addrInt)
 
 class BadPointerPrinter:
@@ -560,10 +1634,10 @@ class BadPointerPrinter:
 
 	def to_string(self):
 		try:
-			_bgtrace("bad pointer .... \n")
+			_bgtrace("bad pointer .... \n", category='printers')
 			return "0x{:x} <bad ptr>".format(str(int(self.val)))
 		except:
-			bgtrace("BadPointerPrinter::to_string(): threw exception accessing ptr val as a long", traceback.format_exc())
+			bgtrace("BadPointerPrinter::to_string(): threw exception accessing ptr val as a long", traceback.format_exc(), level=TRACE_WARN, category='printers')
 
 
 class CharStarPrinter:
@@ -574,24 +1648,57 @@ class CharStarPrinter:
 		ptrVal = int(self.val)
 		if ptrVal==0:
 			return "0x0"
+		return _stopCachedString(self.val, 'char *', self._toString)
+
+	def _toString(self):
+		ptrVal = int(self.val)
+		if bashMemMap.isReadable(ptrVal) is False:
+			return "0x{:x} <invalid mem loc>".format(ptrVal)
 		try:
 			return "'{}'".format(self.val.string());
 		except:
-			bgtrace("CharStarPrinter::to_string(): dereference() threw exception", traceback.format_exc())
-			return "0x{} <invalid mem loc>".format(ptrVal)
+			bgtrace("CharStarPrinter::to_string(): dereference() threw exception", traceback.format_exc(), level=TRACE_WARN, category='printers')
+			return "0x{:x} <invalid mem loc>".format(ptrVal)
 
 
-def isAgdbBashMatch(val):
-	type = str(val.type.unqualified())
-	# if type != str(val.type):
-	# 	_bgtrace("### isAgdbBashMatch({} original:{})\n".format(type, str(val.type)));
+# _bashPrinterFactories maps the canonical type string (as produced by str(type.unqualified())) to a factory that constructs
+# the pretty-printer for a gdb.Value of that type. Use registerBashPrinter to add printers for more bash structs.
+_bashPrinterFactories = {}
+
+# _bashPrinterCache maps a cheap key derived from a gdb.Type (see _printerTypeKey) to the resolved factory. Types that are not
+# bash types are cached as None so that the common, negative case is also one dict access.
+_bashPrinterCache = {}
+
+def registerBashPrinter(typeStr, factory):
+	_bashPrinterFactories[typeStr] = factory
+	_bashPrinterCache.clear()
+
+def registerBashCmdStructPrinter(cmdTypeStr):
+	registerBashPrinter(cmdTypeStr,      lambda val: CmdDynStructPrinter(val, cmdTypeStr))
+	registerBashPrinter(cmdTypeStr+" *", PointerPrinter)
+
+def clearBashPrinterCache(event=None):
+	_bashPrinterCache.clear()
+
+# gdb.Type is not hashable and each val.type access returns a new object so we build a key from the type's attributes. This
+# avoids formatting the type with str() which is the expensive part of the lookup. Unnamed types all share a key but none of them
+# resolve to a printer. Pointers to pointers return None because we never print them (see isAgdbBashMatch). The qualifier test
+# keeps 'const char *' from sharing the 'char *' entry.
+def _printerTypeKey(valType):
+	if valType.code == gdb.TYPE_CODE_PTR:
+		target = valType.target()
+		if target.code == gdb.TYPE_CODE_PTR:
+			return None
+		return (gdb.TYPE_CODE_PTR, target.code, target.name, target.tag, target == target.unqualified())
+	return (valType.code, valType.name, valType.tag)
+
+def _resolvePrinterFactory(valType):
+	type = str(valType.unqualified())
 
 	# for some unknown reason, we get things like 'COMMAND **' when eval a var of type "COMMAND *"
 	# ignoring them seems to work fine
 	if re.search("\*\*$", type):
-		return None;
-
-	if type == 'char *':         return CharStarPrinter(val)
+		return None
 
 	# # We cant dereference all unless we add infinite loop detection and limits for large arrays
 	# # it almost works  but stopping on a frame with the wrong locals can blow it up
@@ -600,52 +1707,40 @@ def isAgdbBashMatch(val):
 	# 	#if re.search("\*$", type):
 	# 	return PointerPrinter(val)
 
-	if type == 'WORD_DESC *':    return PointerPrinter(val)
-	if type == 'WORD_LIST *':    return PointerPrinter(val)
-	if type == 'SHELL_VAR *':    return PointerPrinter(val)
-	if type == 'COMMAND *':      return PointerPrinter(val)
-	if type == 'FOR_COM *':      return PointerPrinter(val)
-	if type == 'CASE_COM *':     return PointerPrinter(val)
-	if type == 'WHILE_COM *':    return PointerPrinter(val)
-	if type == 'IF_COM *':       return PointerPrinter(val)
-	if type == 'SIMPLE_COM *':   return PointerPrinter(val)
-	if type == 'SELECT_COM *':   return PointerPrinter(val)
-	if type == 'CONNECTION *':   return PointerPrinter(val)
-	if type == 'FUNCTION_DEF *': return PointerPrinter(val)
-	if type == 'GROUP_COM *':    return PointerPrinter(val)
-	if type == 'ARITH_COM *':    return PointerPrinter(val)
-	if type == 'COND_COM *':     return PointerPrinter(val)
-	if type == 'ARITH_FOR_COM *':return PointerPrinter(val)
-	if type == 'SUBSHELL_COM *': return PointerPrinter(val)
-	if type == 'COPROC_COM *':   return PointerPrinter(val)
-	if type == 'arrayind_t *':   return PointerPrinter(val)
-
-
-	if type == 'WORD_DESC':    return WordDescPrinter(val)
-	if type == 'WORD_LIST':    return WordListPrinter(val)
-	if type == 'SHELL_VAR':    return ShellVarPrinter(val)
-	if type == 'COMMAND':      return CommandPrinter(val)
-
-	if type == 'FOR_COM':      return CmdDynStructPrinter(val,'FOR_COM')
-	if type == 'CASE_COM':     return CmdDynStructPrinter(val,'CASE_COM')
-	if type == 'WHILE_COM':    return CmdDynStructPrinter(val,'WHILE_COM')
-	if type == 'IF_COM':       return CmdDynStructPrinter(val,'IF_COM')
-	if type == 'SIMPLE_COM':   return CmdDynStructPrinter(val,'SIMPLE_COM')
-	if type == 'SELECT_COM':   return CmdDynStructPrinter(val,'SELECT_COM')
-	if type == 'CONNECTION':   return CmdDynStructPrinter(val,'CONNECTION')
-	if type == 'FUNCTION_DEF': return CmdDynStructPrinter(val,'FUNCTION_DEF')
-	if type == 'GROUP_COM':    return CmdDynStructPrinter(val,'GROUP_COM')
-	if type == 'ARITH_COM':    return CmdDynStructPrinter(val,'ARITH_COM')
-	if type == 'COND_COM':     return CmdDynStructPrinter(val,'COND_COM')
-	if type == 'ARITH_FOR_COM':return CmdDynStructPrinter(val,'ARITH_FOR_COM')
-	if type == 'SUBSHELL_COM': return CmdDynStructPrinter(val,'SUBSHELL_COM')
-	if type == 'COPROC_COM':   return CmdDynStructPrinter(val,'COPROC_COM')
-
-	return None;
-
-gdb.pretty_printers = list(filter(lambda x: getattr(x,'__name__','')!='isAgdbBashMatch', gdb.pretty_printers))
-gdb.pretty_printers.append(isAgdbBashMatch)
-#bgtrace(gdb.pretty_printers)
+	return _bashPrinterFactories.get(type)
+
+def isAgdbBashMatch(val):
+	valType = val.type.unqualified()
+	key = _printerTypeKey(valType)
+	if key is None:
+		return None
+
+	try:
+		factory = _bashPrinterCache[key]
+	except KeyError:
+		factory = _bashPrinterCache[key] = _resolvePrinterFactory(valType)
+
+	return factory(val) if factory else None
+
+registerBashPrinter('char *',        CharStarPrinter)
+registerBashPrinter('WORD_DESC *',   PointerPrinter)
+registerBashPrinter('WORD_LIST *',   PointerPrinter)
+registerBashPrinter('SHELL_VAR *',   PointerPrinter)
+registerBashPrinter('COMMAND *',     PointerPrinter)
+registerBashPrinter('arrayind_t *',  PointerPrinter)
+
+registerBashPrinter('WORD_DESC',     WordDescPrinter)
+registerBashPrinter('WORD_LIST',     WordListPrinter)
+registerBashPrinter('SHELL_VAR',     ShellVarPrinter)
+registerBashPrinter('COMMAND',       CommandPrinter)
+
+for cmdTypeStr in ['FOR_COM', 'CASE_COM', 'WHILE_COM', 'IF_COM', 'SIMPLE_COM', 'SELECT_COM', 'CONNECTION', 'FUNCTION_DEF',
+		'GROUP_COM', 'ARITH_COM', 'COND_COM', 'ARITH_FOR_COM', 'SUBSHELL_COM', 'COPROC_COM']:
+	registerBashCmdStructPrinter(cmdTypeStr)
+
+# isAgdbBashMatch is not added to the global gdb.pretty_printers. registerBashObjfile (at the end of this file) adds it to each
+# bash objfile so that programs other than bash do not pay for it.
+
 
 
 class SymValueWrapper(object):
@@ -657,6 +1752,60 @@ class SymValueWrapper(object):
 	def symbol(self):
 		return self.sym
 
+# LazySymValueWrapper defers sym.value() until gdb asks for the value
+class LazySymValueWrapper(SymValueWrapper):
+	def __init__(self, symbol, name):
+		super(LazySymValueWrapper, self).__init__(name, None)
+		self.gdbSym = symbol
+	def value(self):
+		if self.val is None:
+			try:
+				self.val = self.gdbSym.value()
+			except Exception as e:
+				self.val = "<error: "+str(e)+">"
+		return self.val
+
+
+# _bashGlobalSymbols caches the list of global and file static data symbols visible from each compilation unit. bash has
+# thousands of them and they do not change for the life of the objfile so we only iterate the blocks once.
+_bashGlobalSymbols = {}
+
+def clearBashGlobalSymbols(event=None):
+	_bashGlobalSymbols.clear()
+
+# usage: getBashGlobalSymbols(<block>, [<filterRe>])
+# return the data symbols from the global and static blocks of <block>'s compilation unit whose names match <filterRe>
+def getBashGlobalSymbols(block, filterRe=""):
+	staticBlock = block.static_block
+	key = (staticBlock.start, staticBlock.end, filterRe)
+	syms = _bashGlobalSymbols.get(key)
+	if syms is None:
+		if filterRe:
+			rex = re.compile(filterRe)
+			syms = [sym for sym in getBashGlobalSymbols(block) if rex.search(sym.name)]
+		else:
+			syms = []
+			for gblBlock in [block.global_block, staticBlock]:
+				for sym in gblBlock:
+					if not sym.is_valid():
+						bgtracef("   getBashGlobalSymbols: skipped invalid symbol {}", sym.name, category='frames')
+						continue
+					if sym.is_function or not sym.is_variable:
+						continue
+					syms.append(sym)
+			syms.sort(key=lambda sym: sym.name)
+		_bashGlobalSymbols[key] = syms
+	return syms
+
+def getFrameGlobalSymbols(frame, filterRe=None):
+	try:
+		block = frame.block()
+	except:
+		return []
+	return getBashGlobalSymbols(block, (bgFrameGlobalsFilter.value or "") if filterRe is None else filterRe)
+
+
+
 class BashFrameDecorator(FrameDecorator):
 
 	def __init__(self, frame):
@@ -677,35 +1826,31 @@ class BashFrameDecorator(FrameDecorator):
 				continue
 			vars.append(SymValueWrapper(sym,None))
 
-		while block and not block.is_global:
-			block = block.superblock;
-
-		vars.append(SymValueWrapper("foo", "99"))
-
-		# CRITICALTODO: change to use block.global_block and block.static_block
-		if block:
-			for sym in block:
-				if not sym.is_valid():
-					bgtrace("   FrmDec:frame_locals: skipped invalid symbol "+sym.name)
-					continue
-				if sym.is_function:
-					#bgtrace("   FrmDec:frame_locals: skipped function "+sym.name)
-					continue
-
-				try:
-					vars.append(SymValueWrapper("GBL:"+sym.name,sym.value()))
-				except Exception as e:
-					vars.append(SymValueWrapper("GBL:"+sym.name,"<error: "+str(e)+">"))
-					#bgtrace("   FrmDec:frame_locals: skipped '"+sym.name+"' error="+str(e), traceback.format_exc())
-
-
-		# Add an example of a synthetic local variable.
-		vars.append(SymValueWrapper("bar", 99))
+		# globals are not read here. In 'group' mode we add one synthetic local that tells the UI how many there are so that it
+		# can fetch them with the -bg-frame-globals command when the user expands it. In 'inline' mode, up to bgFrameGlobalsMax
+		# of them are listed but their values are only read if gdb prints them.
+		mode = bgFrameGlobals.value
+		if mode == 'group':
+			vars.append(SymValueWrapper("GBL:*", "{} globals".format(len(getFrameGlobalSymbols(origFrm)))))
+		elif mode == 'inline':
+			syms = getFrameGlobalSymbols(origFrm)
+			if bgFrameGlobalsMax.value:
+				syms = syms[:bgFrameGlobalsMax.value]
+			for sym in syms:
+				vars.append(LazySymValueWrapper(sym, "GBL:"+sym.name))
 
 		return vars
 
 	def function(self):
 		origFrm = self.inferior_frame()
+		try:
+			key = ('function', _frameKey(origFrm))
+		except (gdb.error, ValueError):
+			return self._function(origFrm)
+		return _stopCache.get(key, lambda: self._function(origFrm))
+
+	# the decorated name is built from the frame's locals which do not change while the inferior is stopped
+	def _function(self, origFrm):
 		funcName = str(origFrm.name())
 		if 'execute_builtin_or_function' == funcName:
 			s = WordList_toString(origFrm.block()['words'].value(origFrm))
@@ -728,7 +1873,7 @@ class BashFrameDecorator(FrameDecorator):
 				if trapSummary != trapCmd:
 					trapSummary = trapSummary + " ..."
 			except Exception as e:
-				bgtrace("!!! except while making trapSummary " + e)
+				bgtracef("!!! except while making trapSummary {}", e, level=TRACE_WARN, category='frames')
 				trapSummary = '...'
 			return "{}=Trap<{}> '{}'".format(funcName,signalName, trapSummary)
 
@@ -737,23 +1882,81 @@ class BashFrameDecorator(FrameDecorator):
 
 
 
+# ElidedBashFrameDecorator is a BashFrameDecorator that has a run of interpreter frames folded under it
+class ElidedBashFrameDecorator(BashFrameDecorator):
+	def __init__(self, frame, elidedFrames):
+		super(ElidedBashFrameDecorator, self).__init__(frame)
+		self.elidedFrames = elidedFrames
+
+	def elided(self):
+		return map(BashFrameDecorator, self.elidedFrames)
+
+# the C frames that represent a bash level command. These are the frames that BashFrameDecorator.function() names with the
+# shell command
+_bashMeaningfulFuncs = set(['execute_builtin_or_function', '_run_trap_internal'])
+
+def _isBashMeaningfulFrame(frame):
+	name = frame.name()
+	if name in _bashMeaningfulFuncs:
+		return True
+	if name == 'execute_command':
+		older = frame.older()
+		return older is not None and older.name() == 'reader_loop'
+	return False
+
+# usage: for decorator in elideBashFrames(<frame_iter>)
+# fold the interpreter frames (execute_command_internal, execute_function, expand_word, etc...) that come between two bash
+# meaningful frames under the older of the two using FrameDecorator.elided(). The frames before the first meaningful frame
+# (where the user is debugging the C code) and after the last one are not folded. This is a generator that only looks as far
+# down the stack as it needs to produce the next frame so a caller that wants the first N frames does not walk the whole stack.
+def elideBashFrames(frame_iter):
+	run = None
+	for item in frame_iter:
+		frame = item.inferior_frame()
+		if _isBashMeaningfulFrame(frame):
+			if run:
+				yield ElidedBashFrameDecorator(item, run)
+			else:
+				yield BashFrameDecorator(item)
+			run = []
+		elif run is None:
+			yield BashFrameDecorator(item)
+		else:
+			run.append(item)
+	for item in run or []:
+		yield BashFrameDecorator(item)
+
 class BashFrameIterator:
 	def __init__(self):
 		self.name     = "BashFrameIterator"
 		self.priority = 100
 		self.enabled  = True
-
-		# Register this frame filter with the global frame_filters dictionary.
-		gdb.frame_filters[self.name] = self
-		bgtrace("#### registered "+self.name)
+		# this frame filter is registered with each bash objfile by registerBashObjfile (at the end of this file)
 
 	def filter(self, frame_iter):
-		if bgFrameFilters.value:
+		if bgFrameFilters.value and bgFrameElide.value:
+			wrapped_iter = elideBashFrames(frame_iter)
+		elif bgFrameFilters.value:
 			wrapped_iter = map(BashFrameDecorator, frame_iter)
 		else:
 			wrapped_iter = frame_iter
 		return wrapped_iter
 
+# usage: param = bgParam(<ParamClass>)
+# create the gdb parameter. Creating a parameter with the name of an existing one replaces it in gdb so on a reload, the value
+# that the previous load had is restored. Parameters whose get_set_string applies the value (e.g. resizes a cache) are applied
+# at the end of this file once everything they use is defined.
+_bgParamsToApply = []
+
+def bgParam(cls):
+	param = cls()
+	prevValue = _bgReloadState.get('params', {}).get(cls.__name__)
+	if prevValue is not None and prevValue != param.value:
+		param.value = prevValue
+		if 'get_set_string' in cls.__dict__:
+			_bgParamsToApply.append(param)
+	return param
+
 #When ptr vars are automatically dereferenced, should the ptr's value be displayed also
 class Param_bgShowPtrAddr(gdb.Parameter):
 	def __init__ (self):
@@ -766,20 +1969,79 @@ class Param_bgShowPtrAddr(gdb.Parameter):
 		self.set_doc = "(my set doc)"
 		self.show_doc = "(my show doc)"
 
-bgShowPtrAddr = Param_bgShowPtrAddr()
+bgShowPtrAddr = bgParam(Param_bgShowPtrAddr)
 
-class Param_bgtraceOn(gdb.Parameter):
+# bgtrace sets the trace level. 'off' (the default) makes every trace point a single integer compare
+class Param_bgtrace(gdb.Parameter):
+	"""Set the level of the bgtrace debug tracing done by gdbBash.py"""
 	def __init__ (self):
-		"""(my class doc)"""
-		super (Param_bgtraceOn, self).__init__ (
-				'bgtraceOn',
+		super (Param_bgtrace, self).__init__ (
+				'bgtrace',
 				gdb.COMMAND_DATA,
-				gdb.PARAM_BOOLEAN)
-		self.value = True
-		self.set_doc = "(my set doc)"
-		self.show_doc = "(my show doc)"
+				gdb.PARAM_ENUM,
+				_bgtraceLevelNames)
+		self.value = _bgtraceLevelNames[_bgtraceLevel]
+		self.set_doc = "Set the bgtrace level (off|error|warning|info|debug)"
+		self.show_doc = "Show the bgtrace level"
+
+	def get_set_string(self):
+		bgtraceConfigure(levelName=self.value)
+		return ""
 
-bgtraceOn = Param_bgtraceOn()
+bgtraceParam = bgParam(Param_bgtrace)
+
+# bgtraceCategories limits tracing to a comma separated list of categories. Empty means all categories
+class Param_bgtraceCategories(gdb.Parameter):
+	"""Set the categories that bgtrace will write"""
+	def __init__ (self):
+		super (Param_bgtraceCategories, self).__init__ (
+				'bgtraceCategories',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_STRING)
+		self.value = ",".join(sorted(_bgtraceCategories)) if _bgtraceCategories else ""
+		self.set_doc = "Set the bgtrace categories (comma separated, empty for all)"
+		self.show_doc = "Show the bgtrace categories"
+
+	def get_set_string(self):
+		bgtraceConfigure(categories=self.value or "")
+		return ""
+
+bgtraceCategories = bgParam(Param_bgtraceCategories)
+
+class Param_bgtraceFile(gdb.Parameter):
+	"""Set the file that bgtrace writes to"""
+	def __init__ (self):
+		super (Param_bgtraceFile, self).__init__ (
+				'bgtraceFile',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_STRING)
+		self.value = _bgtraceFilename
+		self.set_doc = "Set the bgtrace output file"
+		self.show_doc = "Show the bgtrace output file"
+
+	def get_set_string(self):
+		if self.value:
+			bgtraceConfigure(filename=self.value)
+		return ""
+
+bgtraceFile = bgParam(Param_bgtraceFile)
+
+class Param_bgtraceMaxBytes(gdb.Parameter):
+	"""Set the size at which the bgtrace file is rotated"""
+	def __init__ (self):
+		super (Param_bgtraceMaxBytes, self).__init__ (
+				'bgtraceMaxBytes',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = _bgtraceMaxBytes
+		self.set_doc = "Set the size in bytes at which the bgtrace file is rotated to <file>.1 (0 for no rotation)"
+		self.show_doc = "Show the bgtrace file rotation size"
+
+	def get_set_string(self):
+		bgtraceConfigure(maxBytes=self.value)
+		return ""
+
+bgtraceMaxBytes = bgParam(Param_bgtraceMaxBytes)
 
 class Param_bgFrameFilters(gdb.Parameter):
 	def __init__ (self):
@@ -792,7 +2054,1739 @@ class Param_bgFrameFilters(gdb.Parameter):
 		self.set_doc = "(my set doc)"
 		self.show_doc = "(my show doc)"
 
-bgFrameFilters = Param_bgFrameFilters()
+bgFrameFilters = bgParam(Param_bgFrameFilters)
+
+# when on (and bgFrameFilters is on), the bash interpreter frames between two bash command frames are folded under the older one
+class Param_bgFrameElide(gdb.Parameter):
+	"""Set whether bash interpreter frames are elided from stack listings"""
+	def __init__ (self):
+		super (Param_bgFrameElide, self).__init__ (
+				'bgFrameElide',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_BOOLEAN)
+		self.value = False
+		self.set_doc = "Set whether bash interpreter frames between bash command frames are elided"
+		self.show_doc = "Show whether bash interpreter frames between bash command frames are elided"
+
+bgFrameElide = bgParam(Param_bgFrameElide)
+
+# bgFrameGlobals controls how the globals of the frame's compilation unit are presented in the frame's locals
+class Param_bgFrameGlobals(gdb.Parameter):
+	"""Set how globals are included in the locals of a bash frame"""
+	def __init__ (self):
+		super (Param_bgFrameGlobals, self).__init__ (
+				'bgFrameGlobals',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ENUM,
+				['off', 'group', 'inline'])
+		self.value = 'group'
+		self.set_doc = "Set how globals appear in frame locals (off|group|inline)"
+		self.show_doc = "Show how globals appear in frame locals"
+
+bgFrameGlobals = bgParam(Param_bgFrameGlobals)
+
+class Param_bgFrameGlobalsFilter(gdb.Parameter):
+	"""Set the regex that global names must match to be listed with a frame"""
+	def __init__ (self):
+		super (Param_bgFrameGlobalsFilter, self).__init__ (
+				'bgFrameGlobalsFilter',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_STRING)
+		self.value = ""
+		self.set_doc = "Set the regex that selects which globals are listed (empty for all)"
+		self.show_doc = "Show the regex that selects which globals are listed"
+
+bgFrameGlobalsFilter = bgParam(Param_bgFrameGlobalsFilter)
+
+class Param_bgFrameGlobalsMax(gdb.Parameter):
+	"""Set the max number of globals listed with a frame"""
+	def __init__ (self):
+		super (Param_bgFrameGlobalsMax, self).__init__ (
+				'bgFrameGlobalsMax',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = 100
+		self.set_doc = "Set the max number of globals listed with a frame (0 for no limit)"
+		self.show_doc = "Show the max number of globals listed with a frame"
+
+bgFrameGlobalsMax = bgParam(Param_bgFrameGlobalsMax)
+
+# bgWordListMaxWords and bgWordListMaxBytes limit how much of a WORD_LIST is read to make its one line summary
+class Param_bgWordListMaxWords(gdb.Parameter):
+	"""Set the max number of words read from a WORD_LIST"""
+	def __init__ (self):
+		super (Param_bgWordListMaxWords, self).__init__ (
+				'bgWordListMaxWords',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = 64
+		self.set_doc = "Set the max number of words read to summarize a WORD_LIST (0 for no limit)"
+		self.show_doc = "Show the max number of words read to summarize a WORD_LIST"
+
+bgWordListMaxWords = bgParam(Param_bgWordListMaxWords)
+
+class Param_bgWordListMaxBytes(gdb.Parameter):
+	"""Set the max number of bytes of text read from a WORD_LIST"""
+	def __init__ (self):
+		super (Param_bgWordListMaxBytes, self).__init__ (
+				'bgWordListMaxBytes',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = 1024
+		self.set_doc = "Set the max number of bytes of word text read to summarize a WORD_LIST (0 for no limit)"
+		self.show_doc = "Show the max number of bytes of word text read to summarize a WORD_LIST"
+
+bgWordListMaxBytes = bgParam(Param_bgWordListMaxBytes)
+
+# bgVarValueMaxBytes and bgVarMaxElements limit how much of each variable's value is read by commands that list many variables
+class Param_bgVarValueMaxBytes(gdb.Parameter):
+	"""Set the max number of bytes read from each bash variable value"""
+	def __init__ (self):
+		super (Param_bgVarValueMaxBytes, self).__init__ (
+				'bgVarValueMaxBytes',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = 4096
+		self.set_doc = "Set the max number of bytes read from each bash variable value (0 for no limit)"
+		self.show_doc = "Show the max number of bytes read from each bash variable value"
+
+bgVarValueMaxBytes = bgParam(Param_bgVarValueMaxBytes)
+
+class Param_bgVarMaxElements(gdb.Parameter):
+	"""Set the max number of elements read from each bash array variable"""
+	def __init__ (self):
+		super (Param_bgVarMaxElements, self).__init__ (
+				'bgVarMaxElements',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = 200
+		self.set_doc = "Set the max number of elements read from each bash array variable (0 for no limit)"
+		self.show_doc = "Show the max number of elements read from each bash array variable"
+
+bgVarMaxElements = bgParam(Param_bgVarMaxElements)
+
+class Param_bgSummaryCacheSize(gdb.Parameter):
+	"""Set the number of COMMAND summaries kept in the summary cache"""
+	def __init__ (self):
+		super (Param_bgSummaryCacheSize, self).__init__ (
+				'bgSummaryCacheSize',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = _cmdSummaryCache.maxSize
+		self.set_doc = "Set the number of COMMAND summaries kept in the summary cache (0 disables the cache)"
+		self.show_doc = "Show the number of COMMAND summaries kept in the summary cache"
+
+	def get_set_string(self):
+		_cmdSummaryCache.resize(self.value)
+		return ""
+
+bgSummaryCacheSize = bgParam(Param_bgSummaryCacheSize)
+
+# when on, a cached COMMAND summary is only used if the COMMAND node's bytes have not changed since it was cached
+class Param_bgSummaryCacheVerify(gdb.Parameter):
+	"""Set whether cached COMMAND summaries are checked against the node contents"""
+	def __init__ (self):
+		super (Param_bgSummaryCacheVerify, self).__init__ (
+				'bgSummaryCacheVerify',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_BOOLEAN)
+		self.value = True
+		self.set_doc = "Set whether cached COMMAND summaries are checked against the node contents"
+		self.show_doc = "Show whether cached COMMAND summaries are checked against the node contents"
+
+bgSummaryCacheVerify = bgParam(Param_bgSummaryCacheVerify)
+
+# bgSummaryMaxChars and bgSummaryMaxNodes bound the work done to make the one line summary of a COMMAND tree
+class Param_bgSummaryMaxChars(gdb.Parameter):
+	"""Set the max length of a COMMAND summary"""
+	def __init__ (self):
+		super (Param_bgSummaryMaxChars, self).__init__ (
+				'bgSummaryMaxChars',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = 256
+		self.set_doc = "Set the max length of a COMMAND summary (0 for no limit)"
+		self.show_doc = "Show the max length of a COMMAND summary"
+
+bgSummaryMaxChars = bgParam(Param_bgSummaryMaxChars)
+
+class Param_bgSummaryMaxNodes(gdb.Parameter):
+	"""Set the max number of COMMAND nodes read to make a summary"""
+	def __init__ (self):
+		super (Param_bgSummaryMaxNodes, self).__init__ (
+				'bgSummaryMaxNodes',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_ZUINTEGER)
+		self.value = 64
+		self.set_doc = "Set the max number of COMMAND nodes read to make a summary (0 for no limit)"
+		self.show_doc = "Show the max number of COMMAND nodes read to make a summary"
+
+bgSummaryMaxNodes = bgParam(Param_bgSummaryMaxNodes)
+
+# when on, the hot paths of this extension are wrapped to record call counts and times (see bg-perf-stats). When off, the
+# original functions are put back so that there is no cost.
+class Param_bgPerfStats(gdb.Parameter):
+	"""Set whether the gdbBash.py hot paths are instrumented"""
+	def __init__ (self):
+		super (Param_bgPerfStats, self).__init__ (
+				'bgPerfStats',
+				gdb.COMMAND_DATA,
+				gdb.PARAM_BOOLEAN)
+		self.value = False
+		self.set_doc = "Set whether the gdbBash.py printers, frame decorators and memory reads are instrumented"
+		self.show_doc = "Show whether the gdbBash.py printers, frame decorators and memory reads are instrumented"
+
+	def get_set_string(self):
+		bgPerfEnable(self.value)
+		return ""
+
+bgPerfStats = bgParam(Param_bgPerfStats)
+
+
+################################################################################################################################
+# Commands
+# Commands that return structured data are written once as a function that takes an argv list and returns a dict.
+# bgRegisterCommand(<name>, <fn>) makes it available as the CLI command 'bg-<name>' which prints the result as json and, when
+# this gdb supports gdb.MICommand (gdb 12+), also as the MI command '-bg-<name>' which returns it as the MI result record.
+
+import json
+
+class _BGCliCommand(gdb.Command):
+	def __init__(self, name, fn):
+		self.__doc__ = fn.__doc__ or "bg-atom-bash-debugger command"
+		super(_BGCliCommand, self).__init__(name, gdb.COMMAND_DATA)
+		self.fn = fn
+
+	def invoke(self, arg, from_tty):
+		result = self.fn(gdb.string_to_argv(arg))
+		gdb.write(json.dumps(result, separators=(',',':'), default=str)+"\n")
+
+# MI result values must be strings, lists or dicts
+def _miResult(obj):
+	if isinstance(obj, dict):
+		return {str(k): _miResult(v) for k, v in obj.items()}
+	if isinstance(obj, (list, tuple)):
+		return [_miResult(v) for v in obj]
+	if obj is None:
+		return ""
+	if isinstance(obj, bool):
+		return "1" if obj else "0"
+	return str(obj)
+
+if hasattr(gdb, 'MICommand'):
+	class _BGMiCommand(gdb.MICommand):
+		def __init__(self, name, fn):
+			super(_BGMiCommand, self).__init__(name)
+			self.fn = fn
+
+		def invoke(self, argv):
+			return _miResult(self.fn(argv))
+
+_bgCommands = {}
+
+def bgRegisterCommand(name, fn):
+	cmds = [_BGCliCommand("bg-"+name, fn)]
+	if hasattr(gdb, 'MICommand'):
+		# gdb 12 can not replace an MI command (MICommand.installed is 13+) so a reload keeps the first load's MI commands
+		try:
+			cmds.append(_BGMiCommand("-bg-"+name, fn))
+		except (RuntimeError, gdb.error) as e:
+			bgtracef("could not register MI command -bg-{}: {}", name, e, level=TRACE_WARN)
+	_bgCommands[name] = cmds
+
+# usage: opts, args = bgParseArgs(argv, {<optName>:<default>...})
+# options are given as --<optName> <value>. The type of the default determines how the value is converted. Options with a
+# bool default are flags that take no value.
+def bgParseArgs(argv, defaults):
+	opts = dict(defaults)
+	args = []
+	i = 0
+	while i < len(argv):
+		arg = argv[i]
+		if arg.startswith("--") and arg[2:] in defaults:
+			name = arg[2:]
+			if isinstance(defaults[name], bool):
+				opts[name] = True
+			else:
+				i += 1
+				if i >= len(argv):
+					raise gdb.GdbError("option '{}' requires a value".format(arg))
+				try:
+					opts[name] = type(defaults[name])(argv[i]) if defaults[name] is not None else argv[i]
+				except ValueError:
+					raise gdb.GdbError("invalid value '{}' for option '{}'".format(argv[i], arg))
+		elif arg.startswith("--"):
+			raise gdb.GdbError("unknown option '{}'".format(arg))
+		else:
+			args.append(arg)
+		i += 1
+	return opts, args
+
+# usage: bg-frame-globals [--frame <n>] [--filter <regex>] [--from <n>] [--to <n>]
+# list the globals (name, type, value) of the compilation unit of frame <n> (default the selected frame). Only the [from,to)
+# slice is read from the inferior
+def cmdFrameGlobals(argv):
+	"""List the globals of a frame's compilation unit with their values.
+usage: bg-frame-globals [--frame <n>] [--filter <regex>] [--from <n>] [--to <n>]"""
+	opts, args = bgParseArgs(argv, {'frame':None, 'filter':'', 'from':0, 'to':0})
+	frame = gdb.selected_frame()
+	if opts['frame'] is not None:
+		try:
+			level = int(opts['frame'])
+		except ValueError:
+			raise gdb.GdbError("invalid value '{}' for option '--frame'".format(opts['frame']))
+		frame = gdb.newest_frame()
+		for i in range(level):
+			frame = frame.older()
+			if not frame:
+				raise gdb.GdbError("frame {} does not exist".format(opts['frame']))
+
+	syms = getFrameGlobalSymbols(frame, opts['filter'] or None)
+	total = len(syms)
+	to = opts['to'] or min(total, opts['from'] + (bgFrameGlobalsMax.value or total))
+	globalsList = []
+	for sym in syms[opts['from']:to]:
+		try:
+			value = BGGetValue(sym.value(frame) if sym.needs_frame else sym.value())
+		except Exception as e:
+			value = "<error: "+str(e)+">"
+		globalsList.append({'name': sym.name, 'type': str(sym.type), 'value': value})
+	return {'total': total, 'from': opts['from'], 'globals': globalsList}
+
+bgRegisterCommand("frame-globals", cmdFrameGlobals)
+
+# _varSnapshots holds the last snapshot of each inferior's shell variables taken by bg-vars-snapshot. It maps the inferior
+# number to {<varName>: (<scope>, <attributes>, <valuePtr>, <value>, <containerFingerprint>)}
+_varSnapshots = {}
+
+def _onExitedClearVarSnapshots(event):
+	inferior = getattr(event, 'inferior', None)
+	if inferior:
+		_varSnapshots.pop(inferior.num, None)
+	else:
+		_varSnapshots.clear()
+
+bgConnect(gdb.events.exited, _onExitedClearVarSnapshots)
+
+# the number of elements at the end of an array that _shellVarContainerFingerprint reads
+_varFingerprintTail = 8
+
+# return what identifies the contents of an array or assoc variable beyond the elements in var['value']. The cost is bounded so
+# that a snapshot of a huge array does not read every element on each stop:
+#    array: num_elements, max_index, the lastref element (bash points it at the element last assigned or referenced) and the
+#           last _varFingerprintTail elements
+#    assoc: nentries and the bucket vector (read in one read). bash inserts new entries at the head of their bucket
+# An element past the first bgVarMaxElements whose value is replaced in place, without changing any of these, is not seen.
+def _shellVarContainerFingerprint(var, reader, maxElements):
+	if not var['valuePtr'] or var['value'] is None or not (var['attributes'] & (att_array|att_assoc)):
+		return None
+	if not maxElements or len(var['value']) < maxElements:
+		# var['value'] already has every element
+		return None
+	if var['attributes'] & att_assoc:
+		tableLayout = bashLayout('HASH_TABLE')
+		tableBuf = reader.read(var['valuePtr'], tableLayout.sizeof)
+		nbuckets = reader.intAt(tableBuf, tableLayout, 'nbuckets')
+		bucketArray = reader.ptrAt(tableBuf, tableLayout.offsets['bucket_array'])
+		buckets = reader.read(bucketArray, nbuckets*reader.ptr.size) if bucketArray and nbuckets > 0 else b''
+		return (reader.intAt(tableBuf, tableLayout, 'nentries'), hash(buckets))
+
+	arrayLayout = bashLayout('ARRAY')
+	elLayout = bashLayout('ARRAY_ELEMENT')
+	arrayBuf = reader.read(var['valuePtr'], arrayLayout.sizeof)
+	fingerprint = [reader.intAt(arrayBuf, arrayLayout, 'num_elements'), reader.intAt(arrayBuf, arrayLayout, 'max_index')]
+	tail = []
+	if 'head' in arrayLayout.offsets:
+		lastref = reader.ptrAt(arrayBuf, arrayLayout.offsets['lastref'])
+		head = reader.ptrAt(arrayBuf, arrayLayout.offsets['head'])
+		if lastref and lastref != head:
+			tail.append(lastref)
+		el = reader.readPtr(head + elLayout.offsets['prev']) if head else 0
+		for i in range(_varFingerprintTail):
+			if not el or el == head:
+				break
+			tail.append(el)
+			el = reader.readPtr(el + elLayout.offsets['prev'])
+	else:
+		elements = reader.ptrAt(arrayBuf, arrayLayout.offsets['elements'])
+		first = reader.intAt(arrayBuf, arrayLayout, 'first_index')
+		last = fingerprint[1]
+		if elements and last >= first:
+			count = min(last-first+1, _varFingerprintTail)
+			vector = reader.read(elements + (last-count+1)*reader.ptr.size, count*reader.ptr.size)
+			tail = [el for el in (reader.ptrAt(vector, i*reader.ptr.size) for i in range(count)) if el]
+	for el in tail:
+		elBuf = reader.read(el, elLayout.sizeof)
+		fingerprint.append((el, reader.intAt(elBuf, elLayout, 'ind'), reader.ptrAt(elBuf, elLayout.offsets['value'])))
+	return tuple(fingerprint)
+
+def _shellVarRecord(scope, var):
+	return {
+		'name':  var['name'],
+		'scope': scope,
+		'type':  ShellVar_typeFromAttr(var['attributes']),
+		'attr':  ShellVar_attrToString(var['attributes']),
+		'value': var['value'] if var['value'] is not None else ""
+	}
+
+# usage: bg-vars-snapshot [--full] [--reset]
+# walk all the bash variable contexts natively and return the variables visible at this point. The first call (or --full)
+# returns every variable in 'added'. Later calls return only the variables added, changed or removed since the previous call
+# for this inferior. --reset discards the kept snapshot without reading anything.
+def cmdVarsSnapshot(argv):
+	"""Return the bash variables that changed since the last snapshot.
+usage: bg-vars-snapshot [--full] [--reset]"""
+	opts, args = bgParseArgs(argv, {'full':False, 'reset':False})
+	inferiorNum = gdb.selected_inferior().num
+	if opts['reset']:
+		_varSnapshots.pop(inferiorNum, None)
+		return {'reset': True}
+
+	prev = None if opts['full'] else _varSnapshots.get(inferiorNum)
+	reader = BashMemReader()
+	shellVariables = bashMeta.globalPtr('shell_variables', reader)
+	maxElements = bgVarMaxElements.value
+	cur = {}
+	added = []
+	changed = []
+	for scope, var in iterVisibleShellVars(shellVariables, reader, bgVarValueMaxBytes.value, maxElements):
+		fingerprint = (scope, var['attributes'], var['valuePtr'], var['value'], _shellVarContainerFingerprint(var, reader, maxElements))
+		cur[var['name']] = fingerprint
+		if prev is None:
+			added.append(_shellVarRecord(scope, var))
+		else:
+			prevFingerprint = prev.get(var['name'])
+			if prevFingerprint is None:
+				added.append(_shellVarRecord(scope, var))
+			elif prevFingerprint != fingerprint:
+				changed.append(_shellVarRecord(scope, var))
+
+	removed = [name for name in prev if name not in cur] if prev is not None else []
+	_varSnapshots[inferiorNum] = cur
+	return {'full': prev is None, 'count': len(cur), 'added': added, 'changed': changed, 'removed': removed}
+
+bgRegisterCommand("vars-snapshot", cmdVarsSnapshot)
+
+# usage: bg-bash-stack [--from <n>] [--to <n>] [--max-frames <n>] [--max-args <n>] [--no-args]
+# return the bash script level call stack (innermost function first) with the source, line and arguments of each frame. It is
+# read natively from bash's FUNCNAME, BASH_SOURCE, BASH_LINENO and positional parameter state so it works on core files too.
+def cmdBashStack(argv):
+	"""Return the bash script level call stack.
+usage: bg-bash-stack [--from <n>] [--to <n>] [--max-frames <n>] [--max-args <n>] [--no-args]"""
+	opts, args = bgParseArgs(argv, {'from':0, 'to':0, 'max-frames':1000, 'max-args':32, 'no-args':False})
+	frames = BashStackReader().read(BashMemReader(), opts['max-frames'], None if opts['no-args'] else opts['max-args'])
+	depth = len(frames)
+	frames = frames[opts['from']:(opts['to'] or depth)]
+	for frame in frames:
+		if frame['args'] is None:
+			del frame['args']
+	return {'depth': depth, 'frames': frames}
+
+bgRegisterCommand("bash-stack", cmdBashStack)
+
+_aggregateTypeCodes = (gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION, gdb.TYPE_CODE_ARRAY)
+
+# return the MI style record for a frame arg or local returned by a frame decorator. <maxLen> limits the value length. Like
+# -stack-list-variables --simple-values, the value of a struct, union or array is only formatted when <allValues> is set
+def _frameVarRecord(item, frame, maxLen, allValues=False):
+	sym = item.symbol()
+	name = sym if isinstance(sym, str) else sym.name
+	record = {'name': name}
+	try:
+		value = item.value()
+		if value is None:
+			value = sym.value(frame)
+		valueType = value.type if isinstance(value, gdb.Value) else (None if isinstance(sym, str) else sym.type)
+		if valueType is not None:
+			record['type'] = str(valueType)
+		if not allValues and valueType is not None and valueType.strip_typedefs().code in _aggregateTypeCodes:
+			return record
+		value = value.format_string() if isinstance(value, gdb.Value) and hasattr(value, 'format_string') else str(value)
+	except Exception as e:
+		value = "<error: "+str(e)+">"
+	if maxLen and len(value) > maxLen:
+		value = value[0:maxLen] + "..."
+	record['value'] = value
+	return record
+
+# yield a FrameDecorator for each frame from the newest down, the same items gdb passes to a frame filter
+def _iterFrameItems():
+	frame = gdb.newest_frame()
+	while frame:
+		yield FrameDecorator(frame)
+		frame = frame.older()
+
+# return the MI style record (level, addr, func, file, fullname, line) of one frame decorator
+def _snapshotFrameRecord(decorator, level):
+	frame = decorator.inferior_frame()
+	frameRec = {'level': level, 'addr': "0x{:x}".format(frame.pc()), 'func': str(decorator.function())}
+	sal = frame.find_sal()
+	if sal and sal.symtab:
+		frameRec['file'] = sal.symtab.filename
+		frameRec['fullname'] = sal.symtab.fullname()
+		frameRec['line'] = sal.line
+	return frameRec
+
+# usage: bg-break-snapshot [--low <n>] [--high <n>] [--vars-frames <n>] [--max-locals <n>] [--max-value-len <n>] [--all-values]
+# return everything the editor shows when the inferior stops in one result. 'frames' has each frame from <low> to <high>
+# (default all) with the same attributes as -stack-list-frames (func is the BashFrameDecorator name when bgFrameFilters is on).
+# When bgFrameElide is also on, the frames go through elideBashFrames like the frame filter and a frame that has interpreter
+# frames folded under it lists them in 'children'. level is always the gdb frame level so it can be used with
+# -stack-select-frame. The first <vars-frames> frames of the range (default 1) also have their 'args' and up to <max-locals>
+# 'locals'. Each variable has a name and type and, unless it is a struct, union or array, a value (--all-values formats those
+# too).
+def cmdBreakSnapshot(argv):
+	"""Return the frames, args and locals of the current stop in one result.
+usage: bg-break-snapshot [--low <n>] [--high <n>] [--vars-frames <n>] [--max-locals <n>] [--max-value-len <n>] [--all-values]"""
+	opts, args = bgParseArgs(argv, {'low':0, 'high':-1, 'vars-frames':1, 'max-locals':100, 'max-value-len':1024, 'all-values':False})
+	if bgFrameFilters.value and bgFrameElide.value:
+		decorators = elideBashFrames(_iterFrameItems())
+	elif bgFrameFilters.value:
+		decorators = map(BashFrameDecorator, _iterFrameItems())
+	else:
+		decorators = _iterFrameItems()
+
+	frames = []
+	level = 0
+	varsFrames = 0
+	for decorator in decorators:
+		# an elided decorator's children are the frames just newer than it
+		children = list(decorator.elided() or [])
+		childLevel = level
+		level += len(children)
+		if opts['high'] >= 0 and level > opts['high']:
+			break
+		if level >= opts['low']:
+			frameRec = _snapshotFrameRecord(decorator, level)
+			if children:
+				frameRec['children'] = [_snapshotFrameRecord(child, childLevel + i) for i, child in enumerate(children)]
+			if varsFrames < opts['vars-frames']:
+				frame = decorator.inferior_frame()
+				frameRec['args'] = [_frameVarRecord(item, frame, opts['max-value-len'], opts['all-values']) for item in (decorator.frame_args() or [])]
+				locals = list(decorator.frame_locals() or [])
+				if opts['max-locals']:
+					locals = locals[0:opts['max-locals']]
+				frameRec['locals'] = [_frameVarRecord(item, frame, opts['max-value-len'], opts['all-values']) for item in locals]
+				varsFrames += 1
+			frames.append(frameRec)
+		level += 1
+	return {'frames': frames}
+
+bgRegisterCommand("break-snapshot", cmdBreakSnapshot)
+
+bgConnect(gdb.events.exited, _cmdSummaryCache.clear)
+
+# usage: bg-cache-stats
+# report the size and hit/miss counts of the caches that gdbBash.py keeps
+def cmdCacheStats(argv):
+	"""Report the statistics of the gdbBash.py caches.
+usage: bg-cache-stats"""
+	return {'summaryCache': _cmdSummaryCache.stats(), 'astCache': _cmdAstCache.stats(), 'stopCache': _stopCache.stats()}
+
+bgRegisterCommand("cache-stats", cmdCacheStats)
+
+
+################################################################################################################################
+# Instrumentation
+# When bgPerfStats is on, each of the _perfTargets is replaced by a wrapper that records the number of calls, the cumulative
+# and max wall time and, for memory reads, the number of bytes returned. Times are inclusive (a printer's time includes the
+# memory reads that it makes). Turning bgPerfStats off restores the original functions.
+
+import functools
+
+# each stat is [calls, totalSeconds, maxSeconds, bytes]
+_perfStats = {}
+_perfOriginals = []
+
+def _perfRecord(statName, elapsed, byteCount=0):
+	stat = _perfStats.get(statName)
+	if stat is None:
+		stat = _perfStats[statName] = [0, 0.0, 0.0, 0]
+	stat[0] += 1
+	stat[1] += elapsed
+	if elapsed > stat[2]:
+		stat[2] = elapsed
+	stat[3] += byteCount
+
+def _perfWrap(statName, fn, countBytes=False):
+	if inspect.isgeneratorfunction(fn):
+		# only the time spent producing each item is counted, not the time the consumer spends between items
+		@functools.wraps(fn)
+		def genWrapper(*args, **kwargs):
+			start = time.perf_counter()
+			gen = fn(*args, **kwargs)
+			elapsed = time.perf_counter() - start
+			try:
+				while True:
+					start = time.perf_counter()
+					try:
+						item = next(gen)
+					finally:
+						elapsed += time.perf_counter() - start
+					yield item
+			except StopIteration:
+				return
+			finally:
+				_perfRecord(statName, elapsed)
+		return genWrapper
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		start = time.perf_counter()
+		try:
+			result = fn(*args, **kwargs)
+		except:
+			_perfRecord(statName, time.perf_counter() - start)
+			raise
+		_perfRecord(statName, time.perf_counter() - start, len(result) if countBytes and result is not None else 0)
+		return result
+	return wrapper
+
+# the (owner, attribute, countBytes) of each function that is instrumented. gdb.parse_and_eval is included so that any
+# expression evaluation (which can make inferior calls) is counted.
+def _perfTargets():
+	targets = []
+	for cls in [ShellVarPrinter, WordListPrinter, WordDescPrinter, CommandPrinter, CmdDynStructPrinter, PointerPrinter, BadPointerPrinter, CharStarPrinter]:
+		for method in ['to_string', 'children']:
+			if method in cls.__dict__:
+				targets.append((cls, method, False))
+	targets.append((BashFrameDecorator, 'function', False))
+	targets.append((BashFrameDecorator, 'frame_locals', False))
+	targets.append((BashMemReader, 'read', True))
+	targets.append((gdb, 'parse_and_eval', False))
+	return targets
+
+def _replaceBashPrinter(old, new):
+	for printers in [gdb.pretty_printers] + [objfile.pretty_printers for objfile in gdb.objfiles()]:
+		printers[:] = [new if x is old else x for x in printers]
+
+def _perfStatName(owner, attr):
+	return "{}.{}".format(owner.__name__, attr)
+
+def bgPerfEnable(enable):
+	global isAgdbBashMatch
+	if enable and not _perfOriginals:
+		for owner, attr, countBytes in _perfTargets():
+			orig = getattr(owner, attr)
+			_perfOriginals.append((owner, attr, orig))
+			setattr(owner, attr, _perfWrap(_perfStatName(owner, attr), orig, countBytes))
+		# isAgdbBashMatch is called through the objfiles' pretty_printers lists so the entries in the lists are what is replaced
+		origMatch = isAgdbBashMatch
+		wrappedMatch = _perfWrap('isAgdbBashMatch', origMatch)
+		_replaceBashPrinter(origMatch, wrappedMatch)
+		isAgdbBashMatch = wrappedMatch
+		_perfOriginals.append((None, 'isAgdbBashMatch', origMatch))
+	elif not enable and _perfOriginals:
+		for owner, attr, orig in reversed(_perfOriginals):
+			if owner is None:
+				_replaceBashPrinter(isAgdbBashMatch, orig)
+				isAgdbBashMatch = orig
+			else:
+				setattr(owner, attr, orig)
+		del _perfOriginals[:]
+
+# usage: bg-perf-stats
+# report the instrumentation counts recorded since bgPerfStats was turned on or bg-perf-reset was last run, most expensive first
+def cmdPerfStats(argv):
+	"""Report the call counts and times recorded while bgPerfStats is on.
+usage: bg-perf-stats"""
+	stats = []
+	for name, (calls, total, maxTime, byteCount) in sorted(_perfStats.items(), key=lambda item: -item[1][1]):
+		stats.append({
+			'name': name,
+			'calls': calls,
+			'totalMs': round(total*1000, 3),
+			'maxMs': round(maxTime*1000, 3),
+			'avgUs': round(total*1000000/calls, 1) if calls else 0,
+			'bytes': byteCount
+		})
+	return {'enabled': bool(bgPerfStats.value), 'stats': stats}
+
+bgRegisterCommand("perf-stats", cmdPerfStats)
+
+# usage: bg-perf-reset
+def cmdPerfReset(argv):
+	"""Clear the counts recorded while bgPerfStats is on.
+usage: bg-perf-reset"""
+	_perfStats.clear()
+	return {'reset': True}
+
+bgRegisterCommand("perf-reset", cmdPerfReset)
+
+
+################################################################################################################################
+# Bash line breakpoints
+# A bash line breakpoint is not a gdb breakpoint. One set of gdb breakpoints on the bash command executors is shared by all of
+# them and their stop() methods read the command's line and BASH_SOURCE natively and return False unless they match one of the
+# targets. gdb does not report the non-matching hits so a loop runs without a round trip to the IDE for each command. The
+# targets are hashed by line so that a hit on a line with no breakpoints is rejected after reading one int.
+
+# bash sets running_trap to the trap's signal number + 1 and DEBUG_TRAP is 65. Like the C breakpoints made by the IDE, we do not
+# stop for the commands of the DEBUG trap.
+_RUNNING_DEBUG_TRAP = 66
+
+# the bash functions that start executing a command that has its own line, as (function, argument, struct type). <argument>
+# is the parameter that points to the command's struct. bash sets line_number before it calls execute_simple_command but the
+# other executors set it themselves from the line of their struct so, at their entry, the line is read from the struct. while,
+# until and if have no line of their own. Their test is a simple, [[ ]] or (( )) command so a breakpoint on their first line
+# is hit through it.
+_bashCommandLocations = [
+	('execute_simple_command',    'simple_command',    'SIMPLE_COM'),
+	('execute_cond_command',      'cond_command',      'COND_COM'),
+	('execute_arith_command',     'arith_command',     'ARITH_COM'),
+	('execute_for_command',       'for_command',       'FOR_COM'),
+	('execute_arith_for_command', 'arith_for_command', 'ARITH_FOR_COM'),
+	('execute_select_command',    'select_command',    'SELECT_COM'),
+	('execute_case_command',      'case_command',      'CASE_COM'),
+]
+
+# return the locations in _bashCommandLocations that exist in this bash (e.g. [[ ]] and select are optional at build time)
+def bashCommandLocations():
+	return [location for location in _bashCommandLocations if location[2] == 'SIMPLE_COM' or bashMeta.symbol(location[0]) is not None]
+
+# return the line of the command that is starting at a breakpoint on <location>, one of bashCommandLocations()
+def bashCommandLine(location, reader):
+	function, argument, structType = location
+	if structType == 'SIMPLE_COM':
+		return bashMeta.globalInt('line_number', reader)
+	layout = bashLayout(structType)
+	cmdAddr = int(gdb.newest_frame().read_var(argument))
+	return reader.intAt(reader.read(cmdAddr, layout.sizeof), layout, 'line')
+
+class BashLineBreakpoint(gdb.Breakpoint):
+	def __init__(self, manager, location):
+		super(BashLineBreakpoint, self).__init__(location[0])
+		self.manager = manager
+		self.location = location
+
+	def stop(self):
+		return self.manager.onHit(self.location)
+
+class BashLineBreakpoints:
+	def __init__(self):
+		self.targets = {}
+		self.byLine = {}
+		self.nextId = 1
+		self.gdbBreakpoints = []
+		self.evaluations = 0
+		self.stops = 0
+		self.lastHit = None
+		self.sourcePaths = {}
+
+	# <id> and <hits> are only given when a reload restores the breakpoints of the previous load so that they keep their ids
+	def insert(self, file, line, temp=False, id=None, hits=0):
+		if id is None:
+			id = self.nextId
+		self.nextId = max(self.nextId, id + 1)
+		target = {'id': id, 'file': file, 'path': self._normPath(file), 'line': line, 'temp': temp, 'hits': hits}
+		self.targets[target['id']] = target
+		self.byLine.setdefault(line, []).append(target)
+		if not self.gdbBreakpoints or not all(bp.is_valid() for bp in self.gdbBreakpoints):
+			self.deleteGdbBreakpoints()
+			self.gdbBreakpoints = [BashLineBreakpoint(self, location) for location in bashCommandLocations()]
+		return target
+
+	def delete(self, id):
+		target = self.targets.pop(id, None)
+		if target is None:
+			return False
+		sameLine = self.byLine.get(target['line'], [])
+		sameLine[:] = [t for t in sameLine if t is not target]
+		if not sameLine:
+			self.byLine.pop(target['line'], None)
+		return True
+
+	# delete the gdb breakpoint when no targets are left. This is not done from stop() because gdb does not allow deleting a
+	# breakpoint while it is deciding whether to stop.
+	def deleteIfUnused(self, event=None):
+		if not self.targets:
+			self.deleteGdbBreakpoints()
+
+	def deleteGdbBreakpoints(self):
+		for bp in self.gdbBreakpoints:
+			if bp.is_valid():
+				bp.delete()
+		self.gdbBreakpoints = []
+
+	# return the numbers of the gdb breakpoints that report the stops of bash line breakpoints
+	def gdbBreakpointNumbers(self):
+		return [bp.number for bp in self.gdbBreakpoints if bp.is_valid()]
+
+	def _normPath(self, path):
+		return os.path.normpath(path)
+
+	# bash records the script path as it was given so it may be relative to the script's working directory. A relative path
+	# (on either side) matches a path that ends with it. The normalized source is memoized per distinct source string.
+	def _sourceMatches(self, targetPath, source):
+		path = self.sourcePaths.get(source)
+		if path is None:
+			path = self.sourcePaths[source] = self._normPath(source)
+		if path == targetPath:
+			return True
+		if not os.path.isabs(path) and targetPath.endswith(os.sep + path):
+			return True
+		return not os.path.isabs(targetPath) and path.endswith(os.sep + targetPath)
+
+	def onHit(self, location):
+		self.evaluations += 1
+		try:
+			reader = BashMemReader()
+			line = bashCommandLine(location, reader)
+			candidates = self.byLine.get(line)
+			if not candidates:
+				return False
+			if bashMeta.globalInt('running_trap', reader) == _RUNNING_DEBUG_TRAP:
+				return False
+			source = BashStackReader().currentSource(reader)
+			for target in candidates:
+				if self._sourceMatches(target['path'], source):
+					target['hits'] += 1
+					self.stops += 1
+					self.lastHit = {'id': target['id'], 'file': source, 'line': line}
+					if target['temp']:
+						self.delete(target['id'])
+					return True
+		except Exception:
+			bgtrace("BashLineBreakpoints::onHit(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='breakpoints')
+		return False
+
+	def list(self):
+		return [{'id': t['id'], 'file': t['file'], 'line': t['line'], 'temp': t['temp'], 'hits': t['hits']} for t in self.targets.values()]
+
+bashLineBreakpoints = BashLineBreakpoints()
+
+bgConnect(gdb.events.stop, bashLineBreakpoints.deleteIfUnused)
+
+# usage: bg-break-insert [--temp] <file>:<line>
+# add a bash line breakpoint. gdbBreakpoints in the result are the numbers that gdb can report in the stop event.
+def cmdBreakInsert(argv):
+	"""Add a bash line breakpoint that is filtered inside gdb.
+usage: bg-break-insert [--temp] <file>:<line>"""
+	opts, args = bgParseArgs(argv, {'temp':False})
+	if len(args) != 1 or ':' not in args[0]:
+		raise gdb.GdbError("usage: bg-break-insert [--temp] <file>:<line>")
+	file, line = args[0].rsplit(':', 1)
+	try:
+		line = int(line)
+	except ValueError:
+		raise gdb.GdbError("invalid line number '{}'".format(line))
+	target = bashLineBreakpoints.insert(file, line, opts['temp'])
+	return {'id': target['id'], 'file': file, 'line': line, 'temp': target['temp'], 'gdbBreakpoints': bashLineBreakpoints.gdbBreakpointNumbers()}
+
+bgRegisterCommand("break-insert", cmdBreakInsert)
+
+# usage: bg-break-delete <id>...
+def cmdBreakDelete(argv):
+	"""Delete bash line breakpoints.
+usage: bg-break-delete <id>..."""
+	opts, args = bgParseArgs(argv, {})
+	deleted = []
+	for arg in args:
+		try:
+			id = int(arg)
+		except ValueError:
+			raise gdb.GdbError("invalid breakpoint id '{}'".format(arg))
+		if bashLineBreakpoints.delete(id):
+			deleted.append(id)
+	bashLineBreakpoints.deleteIfUnused()
+	return {'deleted': deleted}
+
+bgRegisterCommand("break-delete", cmdBreakDelete)
+
+# usage: bg-break-list
+# list the bash line breakpoints with their hit counts. lastHit is the breakpoint that caused the most recent stop.
+def cmdBreakList(argv):
+	"""List the bash line breakpoints.
+usage: bg-break-list"""
+	return {
+		'gdbBreakpoints': bashLineBreakpoints.gdbBreakpointNumbers(),
+		'evaluations': bashLineBreakpoints.evaluations,
+		'stops': bashLineBreakpoints.stops,
+		'lastHit': bashLineBreakpoints.lastHit,
+		'breakpoints': bashLineBreakpoints.list()
+	}
+
+bgRegisterCommand("break-list", cmdBreakList)
+
+
+################################################################################################################################
+# Bash statement stepping
+# bg-step, bg-next and bg-finish resume the inferior with internal breakpoints on the bash command executors (the same locations
+# as the line breakpoints) whose stop() only returns True when the next bash command is at the right function depth. bash's
+# variable_context is the number of function calls on the bash stack. The step breakpoints are deleted by the stop event that
+# follows, whether it was the step that stopped or something else (a breakpoint, a signal), so a step never outlives the stop
+# that ends it.
+
+class BashStepBreakpoint(gdb.Breakpoint):
+	def __init__(self, location, mode, startDepth):
+		super(BashStepBreakpoint, self).__init__(location[0], internal=True)
+		self.mode = mode
+		self.startDepth = startDepth
+
+	def stop(self):
+		try:
+			reader = BashMemReader()
+			if bashMeta.globalInt('running_trap', reader) == _RUNNING_DEBUG_TRAP:
+				return False
+			depth = bashMeta.globalInt('variable_context', reader)
+		except Exception:
+			bgtrace("BashStepBreakpoint::stop(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='breakpoints')
+			return True
+		if self.mode == 'next':
+			return depth <= self.startDepth
+		if self.mode == 'finish':
+			return depth < self.startDepth
+		return True
+
+_bashStepBreakpoints = []
+
+def _endBashStep(event=None):
+	for bp in _bashStepBreakpoints:
+		if bp.is_valid():
+			bp.delete()
+	del _bashStepBreakpoints[:]
+
+bgConnect(gdb.events.stop, _endBashStep)
+bgConnect(gdb.events.exited, _endBashStep)
+
+# resume the inferior until the next bash command that <mode> ('step', 'next' or 'finish') accepts
+def bashStep(mode):
+	if gdb.selected_inferior().pid == 0:
+		raise gdb.GdbError("the program is not being run")
+	startDepth = bashMeta.globalInt('variable_context')
+	_endBashStep()
+	_bashStepBreakpoints.extend(BashStepBreakpoint(location, mode, startDepth) for location in bashCommandLocations())
+	gdb.execute("continue")
+	return {'mode': mode, 'startDepth': startDepth}
+
+# usage: bg-step
+# run to the next bash command, stepping into bash functions
+def cmdBashStep(argv):
+	"""Run to the next bash command, stepping into functions.
+usage: bg-step"""
+	return bashStep('step')
+
+bgRegisterCommand("step", cmdBashStep)
+
+# usage: bg-next
+# run to the next bash command in this bash function (or a caller if it returns), stepping over function calls
+def cmdBashNext(argv):
+	"""Run to the next bash command in this function, stepping over function calls.
+usage: bg-next"""
+	return bashStep('next')
+
+bgRegisterCommand("next", cmdBashNext)
+
+# usage: bg-finish
+# run until this bash function returns to its caller
+def cmdBashFinish(argv):
+	"""Run until the current bash function returns.
+usage: bg-finish"""
+	return bashStep('finish')
+
+bgRegisterCommand("finish", cmdBashFinish)
+
+
+################################################################################################################################
+# State export
+# bg-export-state writes the bash state as JSON lines, one record per line, as it is read so that memory use does not grow with
+# the size of the shell. Everything is read with memory reads (BashMemReader or gdb.Value field access) and nothing is called in
+# the inferior so it works on core files. A section that can not be read writes an 'error' record and the export continues.
+
+# return the fields that describe the COMMAND tree at <cmdPtr>: its one line 'summary' and its parse tree in 'ast' (see
+# getBashCmdAst). A tree that can not be read gets an 'astError' so that the rest of the record is still exported
+def _stateCmdFields(cmdPtr, astMaxNodes, astMaxDepth):
+	vCmdPtr = gdb.Value(cmdPtr).cast(bashMeta.ptrType('COMMAND'))
+	fields = {'summary': ShellCmd_getSummaryText(vCmdPtr)}
+	try:
+		fields['ast'] = getBashCmdAst(vCmdPtr, astMaxNodes, astMaxDepth)
+	except Exception as e:
+		fields['astError'] = str(e)
+	return fields
+
+# yield the JSON line records of the bash state
+def iterBashStateRecords(reader, maxBytes=0, maxElements=0, astMaxNodes=0, astMaxDepth=200):
+	inferior = gdb.selected_inferior()
+	yield {'type': 'meta', 'version': 1, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pid': inferior.pid, 'inferior': inferior.num}
+
+	try:
+		for frame in BashStackReader().read(reader, 0, 0):
+			frame['type'] = 'frame'
+			yield frame
+	except Exception as e:
+		yield {'type': 'error', 'section': 'stack', 'message': str(e)}
+
+	try:
+		ctxLayout = bashLayout('VAR_CONTEXT')
+		for index, (ctxAddr, ctxBuf) in enumerate(iterBashVarContexts(bashMeta.globalPtr('shell_variables', reader), reader)):
+			ctxNamePtr = reader.ptrAt(ctxBuf, ctxLayout.offsets['name'])
+			ctxName = reader.readCString(ctxNamePtr)[0] if ctxNamePtr else "global"
+			yield {'type': 'context', 'index': index, 'name': ctxName, 'addr': "0x{:x}".format(ctxAddr),
+				'scope': reader.intAt(ctxBuf, ctxLayout, 'scope'), 'flags': reader.intAt(ctxBuf, ctxLayout, 'flags')}
+			for keyPtr, varAddr in iterBashHashTable(reader.ptrAt(ctxBuf, ctxLayout.offsets['table']), 0, reader):
+				if varAddr:
+					record = _shellVarRecord(ctxName, readShellVar(varAddr, reader, maxBytes, maxElements))
+					record['type'] = 'var'
+					record['context'] = index
+					yield record
+	except Exception as e:
+		yield {'type': 'error', 'section': 'variables', 'message': str(e)}
+
+	try:
+		defLayout = bashLayout('FUNCTION_DEF')
+		functionDefs = bashMeta.globalPtr('shell_function_defs', reader)
+		for keyPtr, varAddr in iterBashHashTable(bashMeta.globalPtr('shell_functions', reader), 0, reader):
+			if not varAddr:
+				continue
+			var = readShellVar(varAddr, reader)
+			record = {'type': 'function', 'name': var['name'], 'attr': ShellVar_attrToString(var['attributes']), 'source': "", 'line': 0}
+			defAddr = bashHashSearch(functionDefs, var['name'], reader)
+			if defAddr:
+				defBuf = reader.read(defAddr, defLayout.sizeof)
+				sourcePtr = reader.ptrAt(defBuf, defLayout.offsets['source_file'])
+				record['source'] = reader.readCString(sourcePtr)[0] if sourcePtr else ""
+				record['line'] = reader.intAt(defBuf, defLayout, 'line')
+			if var['valuePtr']:
+				record.update(_stateCmdFields(var['valuePtr'], astMaxNodes, astMaxDepth))
+			yield record
+	except Exception as e:
+		yield {'type': 'error', 'section': 'functions', 'message': str(e)}
+
+	try:
+		cmdPtr = bashMeta.globalPtr('currently_executing_command', reader)
+		record = {'type': 'command', 'name': 'currently_executing_command', 'addr': "0x{:x}".format(cmdPtr), 'line': bashMeta.globalInt('line_number', reader)}
+		if cmdPtr:
+			record.update(_stateCmdFields(cmdPtr, astMaxNodes, astMaxDepth))
+		yield record
+	except Exception as e:
+		yield {'type': 'error', 'section': 'command', 'message': str(e)}
+
+# usage: bg-export-state [--max-bytes <n>] [--max-elements <n>] [--ast-max-nodes <n>] [--ast-max-depth <n>] <file>
+# write the bash call stack, every variable of every context, the function definitions and the current command to <file> as
+# JSON lines. By default values are not truncated. Each function body and the current command have their one line 'summary'
+# and their parse tree in 'ast' (the same tree as bg-command-ast). The tree has no node limit by default but it is cut at
+# <ast-max-depth> (default 200) levels of nesting.
+def cmdExportState(argv):
+	"""Write the bash state to a JSON lines file using only memory reads (works on core files).
+usage: bg-export-state [--max-bytes <n>] [--max-elements <n>] [--ast-max-nodes <n>] [--ast-max-depth <n>] <file>"""
+	opts, args = bgParseArgs(argv, {'max-bytes':0, 'max-elements':0, 'ast-max-nodes':0, 'ast-max-depth':200})
+	if len(args) != 1:
+		raise gdb.GdbError("usage: bg-export-state [--max-bytes <n>] [--max-elements <n>] [--ast-max-nodes <n>] [--ast-max-depth <n>] <file>")
+	counts = {}
+	reader = BashMemReader()
+	with open(os.path.expanduser(args[0]), 'w') as f:
+		for record in iterBashStateRecords(reader, opts['max-bytes'], opts['max-elements'], opts['ast-max-nodes'], opts['ast-max-depth']):
+			f.write(json.dumps(record))
+			f.write("\n")
+			counts[record['type']] = counts.get(record['type'], 0) + 1
+		f.write(json.dumps({'type': 'end', 'counts': counts}))
+		f.write("\n")
+	return {'file': args[0], 'counts': counts}
+
+bgRegisterCommand("export-state", cmdExportState)
+
+
+################################################################################################################################
+# Command AST
+# bg-command-ast returns a COMMAND tree as one JSON object so that the IDE does not need a -var-list-children round trip per
+# node. Each node gets an id and a node that is reached a second time is returned as {'ref': <id>}. Chains of CONNECTION nodes
+# with the same connector (how bash stores 'a; b; c' and pipelines) are flattened into one node with a 'commands' list so that
+# long scripts do not make the tree (or this code's recursion) thousands of levels deep. When the node or depth budget runs out
+# the remaining subtrees are returned as {'elided': <addr>}.
+
+class BashCmdAstBuilder:
+	def __init__(self, maxNodes=0, maxDepth=0, reader=None):
+		self.maxNodes = maxNodes
+		self.maxDepth = maxDepth
+		self.reader = reader or BashMemReader()
+		self.ids = {}
+		self.nodeCount = 0
+		self.truncated = False
+
+	def _words(self, vWords):
+		addr = _wordListAddr(vWords)
+		return readWordList(addr, bgWordListMaxWords.value, bgWordListMaxBytes.value, self.reader)[0] if addr else []
+
+	def _word(self, vWordDesc):
+		return vWordDesc['word'].string() if int(vWordDesc) else ""
+
+	# return the node for <vCmdPtr> (a COMMAND *), a ref to it if it was already returned or None for a null pointer
+	def command(self, vCmdPtr, depth=0):
+		addr = int(vCmdPtr)
+		if not addr:
+			return None
+		if addr in self.ids:
+			return {'ref': self.ids[addr]}
+		if (self.maxNodes and self.nodeCount >= self.maxNodes) or (self.maxDepth and depth >= self.maxDepth):
+			self.truncated = True
+			return {'elided': "0x{:x}".format(addr)}
+		vCmd = vCmdPtr.dereference()
+		node = self._newNode(addr, vCmd)
+		vTyped, dynType = ShellCmd_getTypedCmd(vCmd)
+		try:
+			self._fill(node, vTyped, dynType, vCmd, depth+1)
+		except gdb.error as e:
+			node['error'] = str(e)
+		return node
+
+	def _newNode(self, addr, vCmd):
+		node = {
+			'id':    self.nodeCount,
+			'kind':  bashMeta.enumNames('enum command_type').get(int(vCmd['type']), '').replace('cm_', ''),
+			'addr':  "0x{:x}".format(addr),
+			'line':  int(vCmd['line']),
+			'flags': int(vCmd['flags'])
+		}
+		self.ids[addr] = self.nodeCount
+		self.nodeCount += 1
+		return node
+
+	def _fill(self, node, vTyped, dynType, vCmd, depth):
+		if dynType in ('FOR_COM', 'SELECT_COM'):
+			node['var'] = self._word(vTyped['name'])
+			node['list'] = self._words(vTyped['map_list'])
+			node['action'] = self.command(vTyped['action'], depth)
+		elif dynType == 'ARITH_FOR_COM':
+			node['init'] = self._words(vTyped['init'])
+			node['test'] = self._words(vTyped['test'])
+			node['step'] = self._words(vTyped['step'])
+			node['action'] = self.command(vTyped['action'], depth)
+		elif dynType == 'CASE_COM':
+			node['word'] = self._word(vTyped['word'])
+			node['clauses'] = []
+			clause = vTyped['clauses']
+			while int(clause):
+				node['clauses'].append({
+					'patterns': self._words(clause['patterns']),
+					'action':   self.command(clause['action'], depth),
+					'flags':    int(clause['flags'])
+				})
+				clause = clause['next']
+		elif dynType == 'WHILE_COM':
+			node['test'] = self.command(vTyped['test'], depth)
+			node['action'] = self.command(vTyped['action'], depth)
+		elif dynType == 'IF_COM':
+			node['test'] = self.command(vTyped['test'], depth)
+			node['then'] = self.command(vTyped['true_case'], depth)
+			node['else'] = self.command(vTyped['false_case'], depth)
+		elif dynType == 'CONNECTION':
+			self._fillConnection(node, vTyped, depth)
+		elif dynType == 'SIMPLE_COM':
+			node['words'] = self._words(vTyped['words'])
+		elif dynType == 'FUNCTION_DEF':
+			node['name'] = self._word(vTyped['name'])
+			node['source'] = vTyped['source_file'].string() if int(vTyped['source_file']) else ""
+			node['body'] = self.command(vTyped['command'], depth)
+		elif dynType in ('GROUP_COM', 'SUBSHELL_COM'):
+			node['body'] = self.command(vTyped['command'], depth)
+		elif dynType == 'COPROC_COM':
+			node['name'] = vTyped['name'].string() if int(vTyped['name']) else ""
+			node['body'] = self.command(vTyped['command'], depth)
+		elif dynType == 'ARITH_COM':
+			node['exp'] = self._words(vTyped['exp'])
+		elif dynType == 'COND_COM':
+			node['cond'] = self._cond(vTyped, depth)
+
+	# a left-deep chain ((a;b);c) becomes {'connector':';', 'commands':[a,b,c]}. The inner CONNECTION nodes are registered so
+	# that refs to them still resolve to this node.
+	def _fillConnection(self, node, vTyped, depth):
+		connector = int(vTyped['connector'])
+		node['connector'] = ShellCmd_connectorToString(connector)
+		seconds = [vTyped['second']]
+		first = vTyped['first']
+		while int(first) and int(first) not in self.ids and not (self.maxNodes and self.nodeCount >= self.maxNodes):
+			vFirst = first.dereference()
+			vFirstTyped, firstType = ShellCmd_getTypedCmd(vFirst)
+			if firstType != 'CONNECTION' or int(vFirstTyped['connector']) != connector:
+				break
+			self.ids[int(first)] = node['id']
+			self.nodeCount += 1
+			seconds.append(vFirstTyped['second'])
+			first = vFirstTyped['first']
+		commands = [self.command(first, depth)]
+		for second in reversed(seconds):
+			commands.append(self.command(second, depth))
+		node['commands'] = commands
+
+	def _cond(self, vCond, depth):
+		if (self.maxNodes and self.nodeCount >= self.maxNodes) or (self.maxDepth and depth >= self.maxDepth):
+			self.truncated = True
+			return {'elided': "0x{:x}".format(int(vCond.address))}
+		self.nodeCount += 1
+		cond = {'condType': int(vCond['type']), 'op': self._word(vCond['op'])}
+		for side in ['left', 'right']:
+			if int(vCond[side]):
+				cond[side] = self._cond(vCond[side].dereference(), depth+1)
+		return cond
+
+# bash does not change a parsed tree so an AST can be reused until the memory is freed and reused. Like _cmdSummaryCache, the
+# root node's bytes are checked when bgSummaryCacheVerify is on.
+_cmdAstCache = BGLruCache(256)
+
+bgConnect(gdb.events.exited, _cmdAstCache.clear)
+
+def getBashCmdAst(vCmdPtr, maxNodes=0, maxDepth=0):
+	addr = int(vCmdPtr)
+	key = (gdb.selected_inferior().num, addr, maxNodes, maxDepth, bgWordListMaxWords.value, bgWordListMaxBytes.value)
+	fingerprint = None
+	if addr and bgSummaryCacheVerify.value:
+		fingerprint = BashMemReader().read(addr, bashMeta.type('COMMAND').sizeof)
+	entry = _cmdAstCache.get(key)
+	if entry is not None and entry[1] == fingerprint:
+		return entry[0]
+	builder = BashCmdAstBuilder(maxNodes, maxDepth)
+	result = {'root': builder.command(vCmdPtr), 'nodes': builder.nodeCount, 'truncated': builder.truncated}
+	_cmdAstCache.put(key, (result, fingerprint))
+	return result
+
+# usage: bg-command-ast [--function <name>] [--max-nodes <n>] [--max-depth <n>] [<COMMAND * expression>]
+# return the parse tree of a COMMAND as a JSON AST. The command is the body of the bash function <name>, the value of the
+# expression or, by default, currently_executing_command.
+def cmdCommandAst(argv):
+	"""Return the parse tree of a bash COMMAND as a JSON AST.
+usage: bg-command-ast [--function <name>] [--max-nodes <n>] [--max-depth <n>] [<COMMAND * expression>]"""
+	opts, args = bgParseArgs(argv, {'function':'', 'max-nodes':2000, 'max-depth':200})
+	commandPtrType = bashMeta.ptrType('COMMAND')
+	if opts['function']:
+		reader = BashMemReader()
+		varAddr = bashHashSearch(bashMeta.globalPtr('shell_functions', reader), opts['function'], reader)
+		if not varAddr:
+			raise gdb.GdbError("bash function '{}' is not defined".format(opts['function']))
+		vCmdPtr = gdb.Value(readShellVar(varAddr, reader)['valuePtr']).cast(commandPtrType)
+	else:
+		vCmdPtr = gdb.parse_and_eval(" ".join(args) if args else "currently_executing_command")
+		if vCmdPtr.type.strip_typedefs().code != gdb.TYPE_CODE_PTR:
+			vCmdPtr = vCmdPtr.address
+		vCmdPtr = vCmdPtr.cast(commandPtrType)
+	return getBashCmdAst(vCmdPtr, opts['max-nodes'], opts['max-depth'])
+
+bgRegisterCommand("command-ast", cmdCommandAst)
+
+
+################################################################################################################################
+# Fork tracking
+# bash creates every subshell, command substitution and pipeline element with make_child. The fork tracker puts a breakpoint on
+# make_child whose stop() records the fork and returns False so the script runs without stopping. The child's pid is not known
+# at make_child's entry so each record is completed later from bash's last_made_pid (at the next make_child, at the next stop or
+# when the records are listed). Records are kept as tuples in a bounded deque.
+#
+# When a fork's command matches the tracker's filter, detach-on-fork is turned off for that one fork so that gdb keeps the child
+# as a new inferior that can be debugged. It is turned back on when gdb adds the child inferior or at the next make_child.
+
+import collections
+
+# the fields of a fork record tuple. parentSubshellLevel is bash's subshell_level in the forking shell. The child's own level is
+# one more for a ( ... ) or $( ... ) subshell but the same for an external command, and make_child can not tell which it is
+_forkRecordFields = ['seq', 'time', 'parentPid', 'pid', 'parentSubshellLevel', 'command', 'attached']
+
+class BashForkBreakpoint(gdb.Breakpoint):
+	def __init__(self, tracker):
+		super(BashForkBreakpoint, self).__init__("make_child", internal=True)
+		self.tracker = tracker
+
+	def stop(self):
+		try:
+			self.tracker.onMakeChild()
+		except Exception:
+			bgtrace("BashForkBreakpoint::stop(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='forks')
+		return False
+
+class BashForkTracker:
+	def __init__(self):
+		self.records = collections.deque(maxlen=1000)
+		self.gdbBreakpoint = None
+		self.filterRe = None
+		self.seq = 0
+		self.pending = None
+		self.detachOff = False
+
+	def start(self, filterRe=None, maxRecords=1000):
+		self.filterRe = re.compile(filterRe) if filterRe else None
+		if maxRecords != self.records.maxlen:
+			self.records = collections.deque(self.records, maxlen=maxRecords)
+		if self.gdbBreakpoint is None or not self.gdbBreakpoint.is_valid():
+			self.gdbBreakpoint = BashForkBreakpoint(self)
+
+	def stop(self, event=None):
+		self.finishPending()
+		self.restoreDetach()
+		if self.gdbBreakpoint is not None and self.gdbBreakpoint.is_valid():
+			self.gdbBreakpoint.delete()
+		self.gdbBreakpoint = None
+
+	def isRunning(self):
+		return self.gdbBreakpoint is not None and self.gdbBreakpoint.is_valid()
+
+	def onMakeChild(self):
+		reader = BashMemReader()
+		self.finishPending(reader)
+		self.restoreDetach()
+		commandPtr = int(gdb.newest_frame().read_var('command'))
+		command = reader.readCString(commandPtr, bgSummaryMaxChars.value)[0] if commandPtr else ""
+		attach = bool(self.filterRe and self.filterRe.search(command))
+		if attach:
+			gdb.execute("set detach-on-fork off", to_string=True)
+			self.detachOff = True
+		self.seq += 1
+		self.pending = {
+			'seq':           self.seq,
+			'time':          time.time(),
+			'parentPid':     gdb.selected_inferior().pid,
+			'lastMadePid':   bashMeta.globalInt('last_made_pid', reader),
+			'parentSubshellLevel': bashMeta.globalInt('subshell_level', reader),
+			'command':       command,
+			'attached':      attach
+		}
+
+	# complete the pending record with the child's pid once bash has stored it in last_made_pid
+	def finishPending(self, reader=None):
+		pending = self.pending
+		if pending is None or gdb.selected_inferior().pid != pending['parentPid']:
+			return
+		try:
+			pid = bashMeta.globalInt('last_made_pid', reader)
+		except Exception:
+			return
+		if pid == pending['lastMadePid']:
+			return
+		self.pending = None
+		self.records.append((pending['seq'], pending['time'], pending['parentPid'], pid, pending['parentSubshellLevel'], pending['command'], pending['attached']))
+
+	def restoreDetach(self, event=None):
+		if self.detachOff:
+			self.detachOff = False
+			gdb.execute("set detach-on-fork on", to_string=True)
+
+	def onStop(self, event=None):
+		if self.isRunning():
+			self.finishPending()
+
+	def list(self, last=0):
+		records = list(self.records)
+		if last:
+			records = records[-last:]
+		return [dict(zip(_forkRecordFields, record)) for record in records]
+
+bashForkTracker = BashForkTracker()
+
+bgConnect(gdb.events.stop, bashForkTracker.onStop)
+bgConnect(gdb.events.new_inferior, bashForkTracker.restoreDetach)
+
+# usage: bg-fork-track start [--filter <regex>] [--max <n>]
+#        bg-fork-track stop|clear
+#        bg-fork-track list [--last <n>]
+# record the subshells that bash forks without stopping. A fork whose command matches <regex> is kept by gdb as a new inferior.
+def cmdForkTrack(argv):
+	"""Record the subshells that bash forks without stopping at each fork.
+usage: bg-fork-track start [--filter <regex>] [--max <n>]
+       bg-fork-track stop|clear|list [--last <n>]"""
+	opts, args = bgParseArgs(argv, {'filter':'', 'max':1000, 'last':0})
+	action = args[0] if args else 'list'
+	if action == 'start':
+		try:
+			bashForkTracker.start(opts['filter'], opts['max'])
+		except re.error as e:
+			raise gdb.GdbError("invalid filter regex: {}".format(e))
+	elif action == 'stop':
+		bashForkTracker.stop()
+	elif action == 'clear':
+		bashForkTracker.records.clear()
+	elif action != 'list':
+		raise gdb.GdbError("unknown action '{}'. expected start, stop, clear or list".format(action))
+	if action == 'list':
+		bashForkTracker.finishPending()
+	return {
+		'running': bashForkTracker.isRunning(),
+		'filter':  bashForkTracker.filterRe.pattern if bashForkTracker.filterRe else "",
+		'total':   bashForkTracker.seq,
+		'forks':   bashForkTracker.list(opts['last']) if action == 'list' else []
+	}
+
+bgRegisterCommand("fork-track", cmdForkTrack)
+
+
+################################################################################################################################
+# Profiler
+# bg-profile samples the bash (script level) call stack at a fixed rate while the script runs. Instead of interrupting the
+# inferior for each sample, a background thread reads the stack through /proc/<pid>/mem with a ProcMemReader and the same
+# BashStackReader that bg-bash-stack uses, so a sample costs a few hundred bytes of reads and the script is never stopped. This
+# needs a live, native inferior. A sample taken while bash is changing its FUNCNAME/BASH_SOURCE arrays can fail to read and is
+# counted in 'errors'.
+#
+# Samples are aggregated as counts per stack (a tuple of function names, outermost first) so memory depends on the number of
+# distinct stacks, not the number of samples.
+
+import threading
+
+class BashProfiler:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.thread = None
+		self.stopEvent = threading.Event()
+		self.paused = False
+		self.inferiorStopped = False
+		self.reader = None
+		self.stackReader = None
+		self.counts = {}
+		self.samples = 0
+		self.errors = 0
+		self.startTime = None
+		self.stopTime = None
+		self.hz = 100
+		self.maxFrames = 200
+
+	def isRunning(self):
+		return self.thread is not None and self.thread.is_alive()
+
+	def start(self, hz=100, maxFrames=200):
+		inferior = gdb.selected_inferior()
+		if not inferior.pid or not isNativeInferior(inferior):
+			raise gdb.GdbError("bg-profile needs a live inferior that gdb runs natively")
+		self.stop()
+		self.hz = max(1, hz)
+		self.maxFrames = maxFrames
+		self.counts = {}
+		self.samples = 0
+		self.errors = 0
+		self.pid = inferior.pid
+		self.inferiorStopped = not any(thread.is_running() for thread in inferior.threads())
+		self._prime()
+		self.stopEvent.clear()
+		self.startTime = time.time()
+		self.stopTime = None
+		self.thread = threading.Thread(target=self._run, name="bgProfiler", daemon=True)
+		self.thread.start()
+
+	# the layouts and symbol addresses are resolved here, on the gdb thread, so that the sampling thread never calls gdb
+	def _prime(self):
+		self.stackReader = BashStackReader()
+		self.reader = ProcMemReader(self.pid)
+
+	def _run(self):
+		interval = 1.0 / self.hz
+		while not self.stopEvent.wait(interval):
+			with self.lock:
+				if self.stackReader is None or self.inferiorStopped:
+					continue
+				try:
+					funcNames = self.stackReader.readFuncNames(self.reader, self.maxFrames)
+				except ProcessLookupError:
+					break
+				except Exception:
+					self.errors += 1
+					continue
+				stack = tuple(reversed(funcNames))
+				self.counts[stack] = self.counts.get(stack, 0) + 1
+				self.samples += 1
+
+	def stop(self, event=None):
+		if self.thread is not None:
+			self.stopEvent.set()
+			if self.paused:
+				self.resume()
+			self.thread.join()
+			self.thread = None
+			self.stopTime = time.time()
+		if self.reader is not None:
+			self.reader.close()
+			self.reader = None
+		self.stackReader = None
+
+	# pause and resume bracket changes to the objfiles. The layouts that the sampling thread uses are dropped with bashMeta so
+	# they must be resolved again on the gdb thread before sampling continues.
+	def pause(self):
+		if self.isRunning() and not self.paused:
+			self.lock.acquire()
+			self.paused = True
+
+	def resume(self):
+		if self.paused:
+			try:
+				self.stackReader = BashStackReader()
+			except Exception:
+				self.stackReader = None
+			self.paused = False
+			self.lock.release()
+
+	# samples are not taken while gdb has the inferior stopped because the script is not using that time
+	def onInferiorStop(self, event=None):
+		self.inferiorStopped = True
+
+	def onInferiorCont(self, event=None):
+		self.inferiorStopped = False
+
+	def snapshot(self):
+		with self.lock:
+			return dict(self.counts)
+
+	def folded(self, counts):
+		return "".join("{} {}\n".format(";".join(stack), count) for stack, count in sorted(counts.items()))
+
+	# return the functions with the most samples. self counts samples where the function was executing and total counts samples
+	# where it was anywhere on the stack (recursive calls are counted once per sample).
+	def top(self, counts, topN):
+		selfCounts = {}
+		totalCounts = {}
+		for stack, count in counts.items():
+			if not stack:
+				continue
+			selfCounts[stack[-1]] = selfCounts.get(stack[-1], 0) + count
+			for func in set(stack):
+				totalCounts[func] = totalCounts.get(func, 0) + count
+		samples = sum(counts.values()) or 1
+		rows = sorted(totalCounts, key=lambda func: (-selfCounts.get(func, 0), -totalCounts[func]))
+		if topN:
+			rows = rows[0:topN]
+		return [{
+			'func':     func,
+			'self':     selfCounts.get(func, 0),
+			'total':    totalCounts[func],
+			'selfPct':  round(selfCounts.get(func, 0)*100.0/samples, 1),
+			'totalPct': round(totalCounts[func]*100.0/samples, 1)
+		} for func in rows]
+
+bashProfiler = BashProfiler()
+
+bgConnect(gdb.events.exited, bashProfiler.stop)
+bgConnect(gdb.events.stop, bashProfiler.onInferiorStop)
+bgConnect(gdb.events.cont, bashProfiler.onInferiorCont)
+
+# usage: bg-profile start [--hz <n>] [--max-frames <n>]
+#        bg-profile stop
+#        bg-profile report [--top <n>] [--folded <file>]
+# sample the bash call stack while the script runs. report returns the top functions and writes the folded stacks (the input
+# format of flamegraph.pl and similar tools) to <file>, or returns them in 'folded' if no file is given.
+def cmdProfile(argv):
+	"""Sample the bash call stack while the script runs and report where the time goes.
+usage: bg-profile start [--hz <n>] [--max-frames <n>]
+       bg-profile stop
+       bg-profile report [--top <n>] [--folded <file>]"""
+	opts, args = bgParseArgs(argv, {'hz':100, 'max-frames':200, 'top':20, 'folded':''})
+	action = args[0] if args else 'report'
+	if action == 'start':
+		bashProfiler.start(opts['hz'], opts['max-frames'])
+	elif action == 'stop':
+		bashProfiler.stop()
+	elif action != 'report':
+		raise gdb.GdbError("unknown action '{}'. expected start, stop or report".format(action))
+	result = {
+		'running': bashProfiler.isRunning(),
+		'hz':      bashProfiler.hz,
+		'samples': bashProfiler.samples,
+		'errors':  bashProfiler.errors
+	}
+	if bashProfiler.startTime is not None:
+		result['durationSec'] = round((bashProfiler.stopTime or time.time()) - bashProfiler.startTime, 3)
+	if action == 'report':
+		counts = bashProfiler.snapshot()
+		result['top'] = bashProfiler.top(counts, opts['top'])
+		if opts['folded']:
+			with open(os.path.expanduser(opts['folded']), 'w') as f:
+				f.write(bashProfiler.folded(counts))
+			result['foldedFile'] = opts['folded']
+		else:
+			result['folded'] = bashProfiler.folded(counts)
+	return result
+
+bgRegisterCommand("profile", cmdProfile)
+
+
+################################################################################################################################
+# Command tracing
+# bg-trace-commands records every command that bash executes without stopping. There is one internal breakpoint on each of the
+# bashCommandLocations() (simple, [[ ]], (( )), for, for (( )), select and case) whose stop() reads the command's struct
+# natively and returns False. Each record is a small tuple in a ring buffer that keeps the last <size> commands. The command
+# text is interned: it is built once per distinct (struct address, struct bytes) and records refer to it by id, so a loop that
+# runs the same commands many times costs one struct read per command after the first pass. bash frees each top level command
+# after it runs and malloc often gives the next one the same addresses, so the whole struct (which includes the line number and
+# the words pointer) is part of the key, not just its address. A freed command can only be mistaken for a new one parsed at the
+# same address, on the same line with the same pointers (e.g. an eval in a loop).
+# Interned texts are reference counted by the records in the ring buffer and dropped when the last record using them is
+# evicted so memory stays bounded by <size>. Records can also be streamed to a file as JSON lines.
+
+# the fields of a command trace record tuple
+_cmdTraceFields = ['seq', 'time', 'depth', 'line', 'source', 'command']
+
+class BashCmdTraceBreakpoint(gdb.Breakpoint):
+	def __init__(self, tracer, location):
+		super(BashCmdTraceBreakpoint, self).__init__(location[0], internal=True)
+		self.tracer = tracer
+		self.location = location
+
+	def stop(self):
+		try:
+			self.tracer.onCommand(self.location)
+		except Exception:
+			bgtrace("BashCmdTraceBreakpoint::stop(): caught exception", traceback.format_exc(), level=TRACE_WARN, category='cmdtrace')
+		return False
+
+class BashCmdTracer:
+	def __init__(self):
+		self.records = collections.deque(maxlen=10000)
+		self.gdbBreakpoints = []
+		self.seq = 0
+		self.withSource = False
+		self.file = None
+		self.fileName = ""
+		self._clearInterns()
+
+	def _clearInterns(self):
+		self.internIds = {}
+		self.internKeys = {}
+		self.internTexts = {}
+		self.internRefs = {}
+		self.nextInternId = 0
+
+	def isRunning(self):
+		return any(bp.is_valid() for bp in self.gdbBreakpoints)
+
+	def start(self, size=10000, fileName="", withSource=False):
+		if size != self.records.maxlen:
+			while len(self.records) > size:
+				self._release(self.records.popleft())
+			self.records = collections.deque(self.records, maxlen=size)
+		self.withSource = withSource
+		self.closeFile()
+		if fileName:
+			self.file = open(os.path.expanduser(fileName), 'a')
+			self.fileName = fileName
+		if not self.isRunning():
+			self.gdbBreakpoints = [BashCmdTraceBreakpoint(self, location) for location in bashCommandLocations()]
+
+	def stop(self, event=None):
+		for bp in self.gdbBreakpoints:
+			if bp.is_valid():
+				bp.delete()
+		self.gdbBreakpoints = []
+		self.closeFile()
+
+	def closeFile(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+			self.fileName = ""
+
+	def flush(self, event=None):
+		if self.file is not None:
+			self.file.flush()
+
+	def clear(self):
+		self.records.clear()
+		self._clearInterns()
+
+	# return the id of the text interned under <key>, calling makeText() to build it the first time
+	def _intern(self, key, makeText):
+		id = self.internIds.get(key)
+		if id is None:
+			id = self.nextInternId
+			self.nextInternId += 1
+			self.internIds[key] = id
+			self.internKeys[id] = key
+			self.internTexts[id] = makeText()
+			self.internRefs[id] = 0
+		self.internRefs[id] += 1
+		return id
+
+	def _releaseId(self, id):
+		if id is None:
+			return
+		self.internRefs[id] -= 1
+		if self.internRefs[id] <= 0:
+			del self.internRefs[id]
+			del self.internTexts[id]
+			del self.internIds[self.internKeys.pop(id)]
+
+	def _release(self, record):
+		self._releaseId(record[4])
+		self._releaseId(record[5])
+
+	# return the text of a command struct that is not a SIMPLE_COM, the same one line summary that the printers show
+	def _commandText(self, cmdAddr, structType):
+		return CmdDynStruct_getSummaryText(gdb.Value(cmdAddr).cast(bashMeta.ptrType(structType)).dereference(), structType)
+
+	def onCommand(self, location):
+		function, argument, structType = location
+		reader = BashMemReader()
+		cmdLayout = bashLayout(structType)
+		cmdAddr = int(gdb.newest_frame().read_var(argument))
+		cmdBuf = reader.read(cmdAddr, cmdLayout.sizeof)
+		if structType == 'SIMPLE_COM':
+			wordsPtr = reader.ptrAt(cmdBuf, cmdLayout.offsets['words'])
+			commandId = self._intern(('cmd', structType, cmdAddr, cmdBuf), lambda: WordList_toString(wordsPtr))
+		else:
+			commandId = self._intern(('cmd', structType, cmdAddr, cmdBuf), lambda: self._commandText(cmdAddr, structType))
+		sourceId = None
+		if self.withSource:
+			source = BashStackReader().currentSource(reader)
+			sourceId = self._intern(('src', source), lambda: source)
+		self.seq += 1
+		record = (self.seq, time.time(), bashMeta.globalInt('variable_context', reader), reader.intAt(cmdBuf, cmdLayout, 'line'), sourceId, commandId)
+		if len(self.records) == self.records.maxlen:
+			self._release(self.records.popleft() if self.records else record)
+		self.records.append(record)
+		if self.file is not None:
+			self.file.write(json.dumps(self.expand(record)))
+			self.file.write("\n")
+
+	def expand(self, record):
+		record = dict(zip(_cmdTraceFields, record))
+		record['command'] = self.internTexts[record['command']]
+		record['source'] = self.internTexts[record['source']] if record['source'] is not None else ""
+		return record
+
+	def list(self, last=0):
+		records = list(self.records)
+		if last:
+			records = records[-last:]
+		return [self.expand(record) for record in records]
+
+bashCmdTracer = BashCmdTracer()
+
+bgConnect(gdb.events.stop, bashCmdTracer.flush)
+bgConnect(gdb.events.exited, bashCmdTracer.flush)
+
+# usage: bg-trace-commands start [--size <n>] [--file <file>] [--with-source]
+#        bg-trace-commands stop|clear
+#        bg-trace-commands dump [--last <n>] [--file <file>]
+# record the bash commands that are executed without stopping. dump returns the last commands (the history leading up to the
+# current stop) or appends them to <file> as JSON lines. With --file, start also streams each record to <file> as it happens.
+def cmdTraceCommands(argv):
+	"""Record the bash commands that are executed, without stopping, in a ring buffer.
+usage: bg-trace-commands start [--size <n>] [--file <file>] [--with-source]
+       bg-trace-commands stop|clear
+       bg-trace-commands dump [--last <n>] [--file <file>]"""
+	opts, args = bgParseArgs(argv, {'size':10000, 'file':'', 'with-source':False, 'last':0})
+	action = args[0] if args else 'dump'
+	result = {}
+	if action == 'start':
+		bashCmdTracer.start(opts['size'], opts['file'], opts['with-source'])
+	elif action == 'stop':
+		bashCmdTracer.stop()
+	elif action == 'clear':
+		bashCmdTracer.clear()
+	elif action == 'dump':
+		records = bashCmdTracer.list(opts['last'])
+		if opts['file']:
+			with open(os.path.expanduser(opts['file']), 'a') as f:
+				for record in records:
+					f.write(json.dumps(record))
+					f.write("\n")
+			result['file'] = opts['file']
+		else:
+			result['commands'] = records
+	else:
+		raise gdb.GdbError("unknown action '{}'. expected start, stop, clear or dump".format(action))
+	result.update({
+		'running':  bashCmdTracer.isRunning(),
+		'total':    bashCmdTracer.seq,
+		'buffered': len(bashCmdTracer.records),
+		'size':     bashCmdTracer.records.maxlen,
+		'interned': len(bashCmdTracer.internTexts),
+		'stream':   bashCmdTracer.fileName
+	})
+	return result
+
+bgRegisterCommand("trace-commands", cmdTraceCommands)
 
 # gdb.MICommand was introduced in gdb 12 in commit 740b42ceb7c7ae7b5343183782973576a93bc7b3
 # class stepOutToFrmNum(gdb.MICommand):
@@ -818,4 +3812,82 @@ def stepOutToFrmNum(frmNum):
 	gdb.execute("continue")
 
 
+
+################################################################################################################################
+# Registration
+# The printers and the frame filter are registered with each objfile that is a bash binary (one that defines shell_variables)
+# when gdb loads it, so nothing is checked for the values and frames of other programs.
+
 bgFrmItr = BashFrameIterator()
+
+def isBashObjfile(objfile):
+	if hasattr(objfile, 'lookup_global_symbol'):
+		try:
+			return objfile.lookup_global_symbol('shell_variables') is not None
+		except gdb.error:
+			return False
+	return os.path.basename(objfile.filename or "").startswith("bash")
+
+def registerBashObjfile(objfile):
+	objfile.pretty_printers[:] = [x for x in objfile.pretty_printers if getattr(x,'__name__','') != 'isAgdbBashMatch'] + [isAgdbBashMatch]
+	objfile.frame_filters[bgFrmItr.name] = bgFrmItr
+	bgtracef("#### registered printers and {} with {}", bgFrmItr.name, objfile.filename, level=TRACE_INFO)
+
+def onNewObjfileRegister(event):
+	if event.new_objfile.is_valid() and isBashObjfile(event.new_objfile):
+		registerBashObjfile(event.new_objfile)
+
+bgConnect(gdb.events.new_objfile, onNewObjfileRegister)
+
+# loads before per-objfile registration put these in the global lists
+gdb.pretty_printers[:] = [x for x in gdb.pretty_printers if getattr(x,'__name__','') != 'isAgdbBashMatch']
+gdb.frame_filters.pop(bgFrmItr.name, None)
+
+for _objfile in gdb.objfiles():
+	if isBashObjfile(_objfile):
+		registerBashObjfile(_objfile)
+
+# undo everything this load registered with gdb and return the state to carry over to the next load (see Reload at the top of
+# this file). bgUnload is also safe to call directly to remove the extension.
+def bgUnload():
+	state = {
+		'params': {type(v).__name__: v.value for v in list(globals().values()) if isinstance(v, gdb.Parameter)},
+		'lineBreakpoints': [dict(t) for t in bashLineBreakpoints.targets.values()],
+		'lineBreakpointsNextId': bashLineBreakpoints.nextId
+	}
+	bgPerfEnable(False)
+	for eventRegistry, handler in _bgEventConnections:
+		try:
+			eventRegistry.disconnect(handler)
+		except Exception:
+			pass
+	del _bgEventConnections[:]
+
+	for printers in [gdb.pretty_printers] + [objfile.pretty_printers for objfile in gdb.objfiles()]:
+		printers[:] = [x for x in printers if getattr(x,'__name__','') != 'isAgdbBashMatch']
+	for filters in [gdb.frame_filters] + [objfile.frame_filters for objfile in gdb.objfiles()]:
+		filters.pop(bgFrmItr.name, None)
+
+	for cmds in _bgCommands.values():
+		for cmd in cmds:
+			if hasattr(cmd, 'installed'):
+				cmd.installed = False
+	_bgCommands.clear()
+
+	_endBashStep()
+	bashLineBreakpoints.targets.clear()
+	bashLineBreakpoints.byLine.clear()
+	bashLineBreakpoints.deleteGdbBreakpoints()
+	bashForkTracker.stop()
+	bashProfiler.stop()
+	bashCmdTracer.stop()
+
+	bgtraceShutdown()
+	atexit.unregister(bgtraceShutdown)
+	return state
+
+for _param in _bgParamsToApply:
+	_param.get_set_string()
+for _target in _bgReloadState.get('lineBreakpoints', []):
+	bashLineBreakpoints.insert(_target['file'], _target['line'], _target['temp'], _target['id'], _target['hits'])
+bashLineBreakpoints.nextId = max(bashLineBreakpoints.nextId, _bgReloadState.get('lineBreakpointsNextId', 1))
@@ -88,11 +88,24 @@ export class GdbBreakSession extends BreakSession
 	}
 
 
+	// -bg-break-snapshot (from gdbBash.py, gdb 12+) returns the frames and the vars of the top frame in one round trip. If it is
+	// not available we fall back to -stack-list-frames and let selectStackFrame request the vars.
 	async requestFrmStack() {
-		var msg = await this.gdb.sendCmd("-stack-list-frames");
+		var gdbFrames;
+		this.snapshotVars = new Map();
+		try {
+			var msg = await this.gdb.sendCmd("-bg-break-snapshot --thread "+this.thrID);
+			gdbFrames = msg.data.frames;
+			for (var gdbFrame of gdbFrames) {
+				if (gdbFrame.args || gdbFrame.locals)
+					this.snapshotVars.set(parseInt(gdbFrame.level), {args:gdbFrame.args || [], locals:gdbFrame.locals || []});
+			}
+		} catch (e) {
+			var msg = await this.gdb.sendCmd("-stack-list-frames");
+			gdbFrames = msg.data.stack.map((gdbFrame)=>gdbFrame.value);
+		}
 		var stack = [];
-		for (var gdbFrame of msg.data.stack) {
-			gdbFrame = gdbFrame.value;
+		for (var gdbFrame of gdbFrames) {
 			stack.push(new StackFrame(this, {
 				cmdFile:   gdbFrame.file,
 				cmdLineNo: gdbFrame.line,
@@ -111,6 +124,16 @@ export class GdbBreakSession extends BreakSession
 	async requestFrmVars(frmNum) {
 		var vars = [];
 
+		var snapshot = this.snapshotVars && this.snapshotVars.get(parseInt(frmNum));
+		if (snapshot) {
+			for (var arg of snapshot.args)
+				vars.push(Object.assign({scope:"arg"}, arg));
+			for (var local of snapshot.locals)
+				vars.push(Object.assign({scope:"local"}, local));
+			this.setVars(vars);
+			return;
+		}
+
 		var msg = await this.gdb.sendCmd("-stack-list-arguments --thread "+this.thrID+" 2 "+frmNum+" "+frmNum);
 		var stkFrmArgs = msg.data["stack-args"][0].value.args;
 		for (var i in stkFrmArgs) {